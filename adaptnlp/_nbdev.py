@@ -37,6 +37,7 @@ index = {"SentenceResult": "00_result.ipynb",
          "EasyTextGenerator": "09_text_generation.ipynb",
          "QACallback": "10_question_answering.ipynb",
          "QAResult": "10_question_answering.ipynb",
+         "QAContextCache": "10_question_answering.ipynb",
          "TransformersQuestionAnswering": "10_question_answering.ipynb",
          "EasyQuestionAnswering": "10_question_answering.ipynb",
          "normalize_answer": "11_inference.utils.ipynb",
@@ -52,6 +53,7 @@ index = {"SentenceResult": "00_result.ipynb",
          "find_best_thresh": "11_inference.utils.ipynb",
          "find_all_best_thresh": "11_inference.utils.ipynb",
          "squad_evaluate": "11_inference.utils.ipynb",
+         "squad_evaluate_batch": "11_inference.utils.ipynb",
          "get_final_text": "11_inference.utils.ipynb",
          "compute_predictions_logits": "11_inference.utils.ipynb",
          "compute_predictions_log_probs": "11_inference.utils.ipynb",
@@ -68,7 +70,18 @@ index = {"SentenceResult": "00_result.ipynb",
          "LanguageModelDatasets": "14_training.language_model.ipynb",
          "LanguageModelTuner": "14_training.language_model.ipynb",
          "TextNoNewLine": "15_training.arrow_utils.ipynb",
-         "TextNoNewLineDatasetReader": "15_training.arrow_utils.ipynb"}
+         "TextNoNewLineDatasetReader": "15_training.arrow_utils.ipynb",
+         "MicroBatcher": "17_serving.ipynb",
+         "ModelRegistry": "17_serving.ipynb",
+         "InferenceWorkerPool": "17_serving.ipynb",
+         "FAST_MEDIA_TYPES": "17_serving.ipynb",
+         "NDJSON_MEDIA_TYPE": "17_serving.ipynb",
+         "negotiate_media_type": "17_serving.ipynb",
+         "encode_response": "17_serving.ipynb",
+         "respond": "17_serving.ipynb",
+         "iter_mini_batches": "17_serving.ipynb",
+         "ndjson_lines": "17_serving.ipynb",
+         "respond_batch": "17_serving.ipynb"}
 
 modules = ["result.py",
            "callback.py",
@@ -85,7 +98,8 @@ modules = ["result.py",
            "training/core.py",
            "training/sequence_classification.py",
            "training/language_model.py",
-           "training/arrow_utils.py"]
+           "training/arrow_utils.py",
+           "serving.py"]
 
 doc_url = "https://novetta.github.io/adaptnlp/"
 
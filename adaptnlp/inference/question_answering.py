@@ -1,16 +1,22 @@
 # AUTOGENERATED! DO NOT EDIT! File to edit: nbs/10_question_answering.ipynb (unless otherwise specified).
 
-__all__ = ['logger', 'QACallback', 'QAResult', 'TransformersQuestionAnswering', 'EasyQuestionAnswering']
+__all__ = ['logger', 'QACallback', 'QAResult', 'QAContextCache', 'TransformersQuestionAnswering',
+           'EasyQuestionAnswering']
 
 # Cell
+import sys
+import copy
+import hashlib
 import logging
+import threading
+import numpy as np
 from torch import tensor
-from typing import Tuple, List, Union, Dict
+from typing import Tuple, List, Union, Dict, Iterable, Iterator
 from collections import OrderedDict, defaultdict
 from tqdm import tqdm
 
 import torch
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, TensorDataset
 from transformers import (
     AutoTokenizer,
     AutoModelForQuestionAnswering,
@@ -24,16 +30,18 @@ from transformers import (
     SquadExample,
     squad_convert_examples_to_features,
 )
-from transformers.data.processors.squad import SquadResult
+from transformers.data.processors.squad import SquadResult, SquadFeatures, MULTI_SEP_TOKENS_TOKENIZERS_SET
 
 from ..model import AdaptiveModel, DataLoader
 from ..model_hub import HFModelResult
 from .utils import (
     compute_predictions_log_probs,
-    compute_predictions_logits,
+    _BatchLogits,
+    _compute_predictions_from_logits,
+    _compute_softmax,
 )
 
-from fastcore.basics import risinstance, nested_attr, Self, patch, listify
+from fastcore.basics import risinstance, nested_attr, Self, patch, listify, chunked
 
 from fastai.callback.core import Callback
 from fastai.torch_core import apply, to_detach
@@ -69,33 +77,9 @@ class QACallback(Callback):
                     }
                 )
     def after_pred(self):
-        "Generate SquadResults"
-        for i, example_index in enumerate(self.example_indices):
-            eval_feature = self.features[example_index.item()]
-            unique_id = int(eval_feature.unique_id)
-
-            output = [self.pred[output][i] for output in self.pred]
-            output = apply(Self.numpy(), to_detach(output))
-
-            if isinstance(self.learn.model, self.xmodel_instances):
-                # Some models like the ones in `self.xmodel_instances` use 5 arguments for their predictions
-                start_logits = output[0]
-                start_top_index = output[1]
-                end_logits = output[2]
-                end_top_index = output[3]
-                cls_logits = output[4]
-
-                self.learn.pred = SquadResult(
-                    unique_id,
-                    start_logits,
-                    end_logits,
-                    start_top_index=start_top_index,
-                    end_top_index=end_top_index,
-                    cls_logits=cls_logits
-                )
-            else:
-                start_logits, end_logits = output
-                self.learn.pred = SquadResult(unique_id, start_logits, end_logits)
+        "Moves the outputs of the whole batch to the CPU at once, led by the `unique_id` of each feature"
+        unique_ids = tensor([int(self.features[i].unique_id) for i in self.example_indices.tolist()])
+        self.learn.pred = (unique_ids, *to_detach([self.pred[output] for output in self.pred], cpu=True))
 
 # Cell
 from ..result import DetailLevel
@@ -127,11 +111,11 @@ class QAResult:
             return [e.context_text for e in self._examples]
 
     @property
-    def probs(self) -> List[List[tensor]]:
+    def probs(self) -> List[List[float]]:
         """
-        The probabilities returned for each question
+        The probabilities returned for each question, as many as the answers found for it
         """
-        return torch.stack([tensor([o['probability'] for o in self._all_nbest_json[i]]) for i in self._all_nbest_json], dim=0)
+        return [[o['probability'] for o in self._all_nbest_json[i]] for i in self._all_nbest_json]
 
     @property
     def best_answer(self) -> List[str]:
@@ -156,9 +140,9 @@ class QAResult:
                 'best_answers':self.best_answer,
             }
         if detail_level == 'medium' or detail_level == 'high':
-            # Add a dictionary of query and answer and probabilities, also returns contexts
+            # Add a dictionary of answers and probabilities keyed by each example's `qas_id`, also returns contexts
             o['pairings'] = OrderedDict({
-                q:(a,p) for (q,a,p) in zip(self.queries, self.all_answers, self.probs)
+                e.qas_id:(a,p) for (e,a,p) in zip(self._examples, self.all_answers, self.probs)
             })
             o['context'] = self.contexts
         if detail_level == 'high':
@@ -168,6 +152,208 @@ class QAResult:
 
         return o
 
+# Cell
+class QAContextCache:
+    """An LRU cache of tokenized contexts for `TransformersQuestionAnswering`, so contexts that are asked about
+    again only have their questions tokenized
+
+    Entries are keyed by `(context hash, tokenizer, max_seq_length, doc_stride)` and hold the context's `SquadExample`
+    doc tokens and char-to-word map, its subword ids, and how its windows are scored for every query length seen so far
+
+    * **max_size_mb** - Approximate memory cap of the cache in megabytes. The least recently used contexts are evicted past it
+    """
+    def __init__(self, max_size_mb:float=256):
+        self.max_size = int(max_size_mb * 2**20)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size, self.hits, self.misses = 0, 0, 0
+
+    def get(self, key:tuple) -> Union[dict, None]:
+        "Returns the entry under `key` and marks it as the most recently used, or `None` if it is not cached"
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key:tuple, entry:dict, size:int):
+        "Caches `entry` under `key`, taking up roughly `size` bytes"
+        with self._lock:
+            if key in self._entries: self.size -= self._entries.pop(key)['size']
+            entry['size'] = size
+            self._entries[key] = entry
+            self.size += size
+            self._evict()
+
+    def grow(self, key:tuple, size:int):
+        "Accounts for `size` more bytes held by the entry under `key`"
+        with self._lock:
+            if key not in self._entries: return
+            self._entries[key]['size'] += size
+            self.size += size
+            self._evict()
+
+    def _evict(self):
+        while self.size > self.max_size and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self.size -= entry['size']
+
+    def clear(self):
+        "Empties the cache and resets its counters"
+        with self._lock:
+            self._entries.clear()
+            self.size, self.hits, self.misses = 0, 0, 0
+
+    def __len__(self): return len(self._entries)
+
+    def __getstate__(self):
+        "A pickled cache keeps its size cap but none of its entries"
+        return {'max_size': self.max_size}
+
+    def __setstate__(self, state):
+        self.__init__(state['max_size'] / 2**20)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(entries={len(self)}, size={self.size/2**20:.1f}MB/{self.max_size/2**20:.1f}MB, hits={self.hits}, misses={self.misses})'
+
+# Internal Cell
+def _approx_size(*objs) -> int:
+    "Approximate number of bytes held by the strings and lists of ints in `objs`"
+    size = 0
+    for o in objs:
+        size += sys.getsizeof(o)
+        if o and isinstance(o[0], str): size += sum(map(sys.getsizeof, o))
+    return size
+
+def _encode_context(tokenizer, example:SquadExample) -> dict:
+    "Tokenizes the context of `example` into subwords the way `squad_convert_examples_to_features` does"
+    add_prefix_space = tokenizer.__class__.__name__ in [
+        'RobertaTokenizer', 'LongformerTokenizer', 'BartTokenizer',
+        'RobertaTokenizerFast', 'LongformerTokenizerFast', 'BartTokenizerFast'
+    ]
+    tok_to_orig_index, all_doc_tokens = [], []
+    for i, token in enumerate(example.doc_tokens):
+        sub_tokens = tokenizer.tokenize(token, add_prefix_space=True) if add_prefix_space else tokenizer.tokenize(token)
+        tok_to_orig_index += [i] * len(sub_tokens)
+        all_doc_tokens += sub_tokens
+    return {
+        'example': example,
+        'tok_to_orig_index': tok_to_orig_index,
+        'doc_ids': tokenizer.convert_tokens_to_ids(all_doc_tokens),
+        'max_context': {}
+    }
+
+def _doc_spans(
+    n_doc_tokens:int, # Number of subword tokens in the context
+    window_len:int, # Number of context tokens that fit in a window next to the query
+    doc_stride:int # Number of tokens between the starts of consecutive windows
+) -> List[Tuple[int, int]]:
+    "The `(start, length)` of every window a context is split into"
+    spans, start = [], 0
+    while start < n_doc_tokens:
+        spans.append((start, min(n_doc_tokens - start, window_len)))
+        if n_doc_tokens - start <= window_len: break
+        start += doc_stride
+    return spans
+
+def _max_context_spans(spans:List[Tuple[int, int]], n_doc_tokens:int) -> np.ndarray:
+    "The index of the window holding the most context around every token, with the same scoring as `_new_check_is_max_context`"
+    if not spans: return np.zeros(0, dtype=np.int64)
+    starts, lengths = np.array(spans).T
+    ends = starts + lengths - 1
+    positions = np.arange(n_doc_tokens)
+    scores = np.minimum(positions - starts[:, None], ends[:, None] - positions) + 0.01 * lengths[:, None]
+    inside = (positions >= starts[:, None]) & (positions <= ends[:, None])
+    # `argmax` keeps the first of tied windows, like the strict comparison in `_new_check_is_max_context`
+    return np.where(inside, scores, -np.inf).argmax(0)
+
+def _context_features(
+    tokenizer, # A right-padding tokenizer object from Huggingface's transformers
+    truncated_query:List[int], # The token ids of a question, truncated to `max_query_length` tokens
+    entry:dict, # A cached context, as built by `_encode_context`
+    max_seq_length:int, # Maximum length of a window, including the query and special tokens
+    doc_stride:int # Number of tokens between the starts of consecutive windows
+) -> Tuple[List[SquadFeatures], int]:
+    """
+    Builds the same `SquadFeatures` as `squad_convert_examples_to_features` for `truncated_query` against a cached context.
+    Also returns the bytes newly held by `entry`
+    """
+    tokenizer_type = type(tokenizer).__name__.replace('Tokenizer', '').lower()
+    sequence_added_tokens = tokenizer.model_max_length - tokenizer.max_len_single_sentence
+    if tokenizer_type in MULTI_SEP_TOKENS_TOKENIZERS_SET: sequence_added_tokens += 1
+    sequence_pair_added_tokens = tokenizer.model_max_length - tokenizer.max_len_sentences_pair
+
+    doc_ids, tok_to_orig_index = entry['doc_ids'], entry['tok_to_orig_index']
+    spans = _doc_spans(len(doc_ids), max_seq_length - len(truncated_query) - sequence_pair_added_tokens, doc_stride)
+    # Windows only depend on the query through its length, so neither does the max context of each token
+    grown = 0
+    max_context = entry['max_context'].get(len(truncated_query))
+    if max_context is None:
+        max_context = entry['max_context'][len(truncated_query)] = _max_context_spans(spans, len(doc_ids))
+        grown = max_context.nbytes
+
+    offset = len(truncated_query) + sequence_added_tokens
+    features = []
+    for span_index, (start, paragraph_len) in enumerate(spans):
+        span_ids = doc_ids[start:start+paragraph_len]
+        input_ids = tokenizer.build_inputs_with_special_tokens(truncated_query, span_ids)
+        token_type_ids = tokenizer.create_token_type_ids_from_sequences(truncated_query, span_ids)
+        n_pad = max_seq_length - len(input_ids)
+        attention_mask = [1] * len(input_ids) + [0] * n_pad
+        input_ids = input_ids + [tokenizer.pad_token_id] * n_pad
+        token_type_ids = token_type_ids + [tokenizer.pad_token_type_id] * n_pad
+
+        non_padded_ids = input_ids[:input_ids.index(tokenizer.pad_token_id)] if tokenizer.pad_token_id in input_ids else input_ids
+        cls_index = input_ids.index(tokenizer.cls_token_id)
+        p_mask = np.ones_like(token_type_ids)
+        p_mask[offset:] = 0
+        p_mask[np.asarray(tokenizer.get_special_tokens_mask(input_ids, already_has_special_tokens=True)).nonzero()] = 1
+        p_mask[cls_index] = 0
+
+        features.append(SquadFeatures(
+            input_ids,
+            attention_mask,
+            token_type_ids,
+            cls_index,
+            p_mask.tolist(),
+            example_index=0,
+            unique_id=0,
+            paragraph_len=paragraph_len,
+            token_is_max_context={offset+j: bool(max_context[start+j] == span_index) for j in range(paragraph_len)},
+            tokens=tokenizer.convert_ids_to_tokens(non_padded_ids),
+            token_to_orig_map={offset+j: tok_to_orig_index[start+j] for j in range(paragraph_len)},
+            start_position=0,
+            end_position=0,
+            is_impossible=entry['example'].is_impossible,
+            qas_id=None,
+        ))
+    return features, grown
+
+# Internal Cell
+def _rank_passage_answers(
+    all_nbest_json:OrderedDict, # The `n_best_json` of every passage, keyed by its index as a string
+    top_k:int # Number of answers to keep
+) -> List[OrderedDict]:
+    "Ranks the answers of every passage in `all_nbest_json` by their span scores and keeps the `top_k` best"
+    answers = []
+    for passage_id, nbest_json in all_nbest_json.items():
+        for entry in nbest_json:
+            # Skip null answers, and the nonce prediction of passages without a valid span
+            if not entry['text'] or (entry['text'] == 'empty' and entry.get('start_logit') == entry.get('end_logit') == 0.0): continue
+            score = entry['start_logit'] + entry['end_logit'] if 'start_logit' in entry else entry['start_log_prob'] + entry['end_log_prob']
+            answers.append((score, int(passage_id), entry))
+    answers.sort(key=lambda o: o[0], reverse=True)
+    probs = _compute_softmax([score for score, *_ in answers])
+    ranked = []
+    for (score, passage_id, entry), prob in zip(answers[:top_k], probs):
+        answer = OrderedDict(text=entry['text'], passage_id=passage_id, score=score, probability=prob)
+        answer.update((k, v) for k, v in entry.items() if k not in answer)
+        ranked.append(answer)
+    return ranked
+
 # Cell
 class TransformersQuestionAnswering(AdaptiveModel):
     """Adaptive Model for Transformers Question Answering Model
@@ -187,6 +373,7 @@ class TransformersQuestionAnswering(AdaptiveModel):
         # Sets internal model
         self.set_model(model)
         self.xmodel_instances = (XLNetForQuestionAnswering, XLMForQuestionAnswering)
+        self.context_cache = QAContextCache()
 
     @classmethod
     def load(cls, model_name_or_path: str) -> AdaptiveModel:
@@ -214,6 +401,8 @@ class TransformersQuestionAnswering(AdaptiveModel):
         max_seq_length: int = 512,
         doc_stride: int = 128,
         max_query_length: int = 64,
+        threads: int = 1,
+        use_context_cache: bool = True,
         **kwargs,
     ) -> Tuple[Tuple[str, List[OrderedDict]], Tuple[OrderedDict, OrderedDict]]:
         """Predict method for running inference using the pre-trained question answering model
@@ -230,6 +419,8 @@ class TransformersQuestionAnswering(AdaptiveModel):
         * **max_seq_length** - Maximum context token length. Check model configs to see max sequence length the model was trained with
         * **doc_stride** - Number of token strides to take when splitting up conext into chunks of size `max_seq_length`
         * **max_query_length** - Maximum token length for queries
+        * **threads** - Number of worker processes converting examples to features when the context cache is not used. Worth raising for long contexts
+        * **use_context_cache** - Whether to reuse the tokenized contexts held in `self.context_cache`, so repeated contexts only have their queries tokenized
         * **&ast;&ast;kwargs**(Optional) - Optional arguments for the Transformers model (mostly for saving evaluations)
         """
         # Make string input consistent as list
@@ -238,26 +429,47 @@ class TransformersQuestionAnswering(AdaptiveModel):
             context = [context]
         assert len(query) == len(context)
 
-        examples = self._mini_squad_processor(query=query, context=context)
-        features, dataset = squad_convert_examples_to_features(
-            examples,
-            self.tokenizer,
-            max_seq_length=max_seq_length,
-            doc_stride=doc_stride,
-            max_query_length=max_query_length,
-            is_training=False,
-            return_dataset='pt',
-            threads=1,
-        )
-        all_results = []
+        # The cached conversion follows `squad_convert_examples_to_features` for right-padding tokenizers only
+        if use_context_cache and self.context_cache is not None and self.tokenizer.padding_side == 'right':
+            examples, features, dataset = self._cached_squad_features(
+                query, context, max_seq_length, doc_stride, max_query_length
+            )
+        else:
+            examples = self._mini_squad_processor(query=query, context=context)
+            features, dataset = squad_convert_examples_to_features(
+                examples,
+                self.tokenizer,
+                max_seq_length=max_seq_length,
+                doc_stride=doc_stride,
+                max_query_length=max_query_length,
+                is_training=False,
+                return_dataset='pt',
+                threads=threads,
+            )
 
         dl = DataLoader(dataset, batch_size=mini_batch_size)
 
         cb = QACallback(self.xmodel_instances, features)
 
-        all_results, _ = super().get_preds(dl=dl, cbs=[cb])
+        preds, _ = super().get_preds(dl=dl, cbs=[cb])
+
+        # One contiguous array per output, with a row for every feature
+        unique_ids, *outputs = [torch.cat(o).numpy() for o in zip(*preds)]
 
         if isinstance(self.model, self.xmodel_instances):
+            # Some models like the ones in `self.xmodel_instances` use 5 arguments for their predictions
+            start_logits, start_top_index, end_logits, end_top_index, cls_logits = outputs
+            all_results = [
+                SquadResult(
+                    unique_id,
+                    start_logits[i].tolist(),
+                    end_logits[i].tolist(),
+                    start_top_index=start_top_index[i].tolist(),
+                    end_top_index=end_top_index[i].tolist(),
+                    cls_logits=cls_logits[i].tolist()
+                )
+                for i, unique_id in enumerate(unique_ids.tolist())
+            ]
             start_n_top = (
                 self.model.config.start_n_top
                 if hasattr(self.model, 'config')
@@ -284,10 +496,11 @@ class TransformersQuestionAnswering(AdaptiveModel):
             )
 
         else:
-            answers, n_best = compute_predictions_logits(
+            start_logits, end_logits = outputs[0], outputs[1]
+            answers, n_best = _compute_predictions_from_logits(
                 examples,
                 features,
-                all_results,
+                _BatchLogits(unique_ids, start_logits, end_logits),
                 n_best_size,
                 max_answer_length,
                 do_lower_case,
@@ -300,6 +513,96 @@ class TransformersQuestionAnswering(AdaptiveModel):
 
         return examples, answers, n_best
 
+    def predict_passages(
+        self,
+        query: str,
+        contexts: List[str],
+        top_k: int = 5,
+        n_best_size: int = 5,
+        mini_batch_size: int = 32,
+        **kwargs,
+    ) -> List[OrderedDict]:
+        """Answers `query` over every passage in `contexts` in one batched call, and ranks the answers of all passages together
+
+        Answers are ranked by the sum of their start and end logits (or log probabilities for XLNet and XLM models), which
+        unlike `probability` are comparable across passages. Null answers are left out
+
+        * **query** - A question to ask of every passage
+        * **contexts** - A list of candidate passages
+        * **top_k** - Number of answers returned across all passages
+        * **n_best_size** - Number of answers considered from each passage
+        * **mini_batch_size** - Mini batch size. The windows of all passages are batched together
+        * **&ast;&ast;kwargs**(Optional) - Optional arguments for `predict`
+
+        **return** - The `top_k` best answers, each with its `passage_id` (its index in `contexts`), `score` and
+        `probability` among all answers, followed by its `n_best_json` fields
+        """
+        if not contexts: return []
+        _, _, n_best = self.predict(
+            query=[query] * len(contexts),
+            context=list(contexts),
+            n_best_size=n_best_size,
+            mini_batch_size=mini_batch_size,
+            **kwargs,
+        )
+        return _rank_passage_answers(n_best, top_k)
+
+    def _cached_squad_features(
+        self,
+        query: List[str],
+        context: List[str],
+        max_seq_length: int,
+        doc_stride: int,
+        max_query_length: int,
+    ) -> Tuple[List[SquadExample], List[SquadFeatures], TensorDataset]:
+        """Builds the same examples, features and dataset as `squad_convert_examples_to_features`, looking up every context in `self.context_cache`
+
+        * **query** - List of query strings, must be same length as `context`
+        * **context** - List of context strings, must be same length as `query`
+        * **max_seq_length** - Maximum context token length
+        * **doc_stride** - Number of token strides to take when splitting up conext into chunks of size `max_seq_length`
+        * **max_query_length** - Maximum token length for queries
+        """
+        tokenizer_key = (type(self.tokenizer).__name__, self.tokenizer.name_or_path)
+        examples, features, truncated_queries = [], [], {}
+        example_index, unique_id = 0, 1000000000
+        for idx, (q, c) in enumerate(zip(query, context)):
+            # A query asked over many contexts is only tokenized once
+            if q not in truncated_queries:
+                truncated_queries[q] = self.tokenizer.encode(q, add_special_tokens=False, truncation=True, max_length=max_query_length)
+            key = (hashlib.sha256(c.encode('utf-8')).hexdigest(), tokenizer_key, max_seq_length, doc_stride)
+            entry = self.context_cache.get(key)
+            if entry is None:
+                entry = _encode_context(self.tokenizer, self._mini_squad_processor(query=[''], context=[c])[0])
+                example = entry['example']
+                self.context_cache.put(key, entry, _approx_size(
+                    c, example.doc_tokens, example.char_to_word_offset, entry['tok_to_orig_index'], entry['doc_ids']
+                ))
+            # The copy shares the cached doc tokens and char-to-word map, which are only read from
+            example = copy.copy(entry['example'])
+            example.qas_id, example.question_text = str(idx), q
+            examples.append(example)
+
+            example_features, grown = _context_features(self.tokenizer, truncated_queries[q], entry, max_seq_length, doc_stride)
+            if grown: self.context_cache.grow(key, grown)
+            # Like `squad_convert_examples_to_features`, examples without features don't take up an `example_index`
+            if not example_features: continue
+            for feature in example_features:
+                feature.qas_id, feature.example_index, feature.unique_id = example.qas_id, example_index, unique_id
+                unique_id += 1
+            features += example_features
+            example_index += 1
+
+        dataset = TensorDataset(
+            torch.tensor([f.input_ids for f in features], dtype=torch.long),
+            torch.tensor([f.attention_mask for f in features], dtype=torch.long),
+            torch.tensor([f.token_type_ids for f in features], dtype=torch.long),
+            torch.arange(len(features), dtype=torch.long),
+            torch.tensor([f.cls_index for f in features], dtype=torch.long),
+            torch.tensor([f.p_mask for f in features], dtype=torch.float),
+        )
+        return examples, features, dataset
+
     def _mini_squad_processor(
         self, query: List[str], context: List[str]
     ) -> List[SquadExample]:
@@ -367,6 +670,57 @@ class EasyQuestionAnswering:
 
         **return** - Either a dictionary of results or a QAResult
         """
+        model = self._get_model(model_name_or_path)
+
+        examples, top_answer, top_n_answers = model.predict(
+            query=query,
+            context=context,
+            n_best_size=n_best_size,
+            mini_batch_size=mini_batch_size,
+            **kwargs,
+        )
+
+        result = QAResult(examples, top_answer, top_n_answers)
+
+        return result.to_dict(detail_level) if detail_level is not None else result
+
+    def predict_passages(
+        self,
+        query: str,
+        contexts: List[str],
+        top_k: int = 5,
+        n_best_size: int = 5,
+        mini_batch_size: int = 32,
+        model_name_or_path: Union[str, HFModelResult] = 'bert-large-uncased-whole-word-masking-finetuned-squad',
+        **kwargs,
+    ) -> List[OrderedDict]:
+        """Answers one query over many passages in a single batched call, ranking the answers of all passages together
+
+        * **query** - A question to ask of every passage
+        * **contexts** - A list of candidate passages
+        * **top_k** - Number of answers returned across all passages
+        * **n_best_size** - Number of answers considered from each passage
+        * **mini_batch_size** - Mini batch size for inference
+        * **model_name_or_path** - Path to QA model or name of QA model at huggingface.co/models
+        * **kwargs**(Optional) - Keyword arguments for `TransformersQuestionAnswering.predict`
+
+        **return** - The `top_k` best answers, each with the `passage_id` of the context it was found in
+        """
+        model = self._get_model(model_name_or_path)
+        return model.predict_passages(
+            query=query,
+            contexts=contexts,
+            top_k=top_k,
+            n_best_size=n_best_size,
+            mini_batch_size=mini_batch_size,
+            **kwargs,
+        )
+
+    def _get_model(self, model_name_or_path: Union[str, HFModelResult]) -> TransformersQuestionAnswering:
+        """Loads `model_name_or_path` the first time it is asked for
+
+        * **model_name_or_path** - Path to QA model or name of QA model at huggingface.co/models
+        """
         name = getattr(model_name_or_path, 'name', model_name_or_path)
         try:
             if not self.models[name]:
@@ -380,18 +734,39 @@ class EasyQuestionAnswering:
             raise ValueError(
                 f'{name} is not a valid path or model name from huggingface.co/models'
             )
-            return OrderedDict(), [OrderedDict()]
+        return self.models[name]
 
-        model = self.models[name]
 
-        examples, top_answer, top_n_answers = model.predict(
-            query=query,
-            context=context,
-            n_best_size=n_best_size,
-            mini_batch_size=mini_batch_size,
-            **kwargs,
-        )
+    def predict_stream(
+        self,
+        query_context: Iterable[Tuple[str, str]], # Any iterable of `(query, context)` pairs
+        n_best_size: int = 5,
+        mini_batch_size: int = 32,
+        model_name_or_path: Union[str, HFModelResult] = 'bert-large-uncased-whole-word-masking-finetuned-squad',
+        detail_level = DetailLevel.Low,
+        chunk_size: int = 256,
+        **kwargs,
+    ) -> Iterator[Union[QAResult, dict]]:
+        """Lazily predicts answers for `query_context` in chunks of `chunk_size`, yielding the answers of each chunk as soon as they are ready
 
-        result = QAResult(examples, top_answer, top_n_answers)
+        * **query_context** - Any iterable of `(query, context)` pairs
+        * **n_best_size** - The top n answers returned
+        * **mini_batch_size** - Mini batch size for inference
+        * **model_name_or_path** - Path to QA model or name of QA model at huggingface.co/models
+        * **detail_level** - String or DetailLevel of what amount of information should be returned. If `None` will return `QAResult`
+        * **chunk_size** - The number of pairs held in memory and answered at a time
+        * **kwargs**(Optional) - Keyword arguments for `predict_qa`
 
-        return result.to_dict(detail_level) if detail_level is not None else result
\ No newline at end of file
+        **return** - The result of `predict_qa` for each chunk
+        """
+        for chunk in chunked(query_context, chunk_size):
+            query, context = zip(*chunk)
+            yield self.predict_qa(
+                query=list(query),
+                context=list(context),
+                n_best_size=n_best_size,
+                mini_batch_size=mini_batch_size,
+                model_name_or_path=model_name_or_path,
+                detail_level=detail_level,
+                **kwargs,
+            )
\ No newline at end of file
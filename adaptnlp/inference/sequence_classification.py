@@ -5,7 +5,7 @@ __all__ = ['logger', 'SequenceResult', 'TransformersSequenceClassifier', 'FlairS
 
 # Cell
 import logging
-from typing import List, Dict, Union, Tuple, Callable
+from typing import List, Dict, Union, Tuple, Callable, Iterable, Iterator
 from collections import defaultdict, OrderedDict
 from pathlib import Path
 
@@ -32,12 +32,13 @@ from transformers import (
     AlbertForSequenceClassification,
     TrainingArguments,
     Trainer,
+    BatchEncoding,
 )
 
-from ..model import AdaptiveModel
+from ..model import AdaptiveModel, _bucketed_dataloader, _windowed_encodings
 from ..model_hub import HFModelResult, FlairModelResult
 
-from fastcore.basics import risinstance
+from fastcore.basics import risinstance, ifnone, chunked
 from fastcore.xtras import Path
 from ..result import DetailLevel, SentenceResult
 
@@ -48,31 +49,85 @@ logger = logging.getLogger(__name__)
 
 # Cell
 class SequenceResult(SentenceResult):
-    "A result class designed for Sequence Classification models"
+    """
+    A result class designed for Sequence Classification models
+
+    Can either be built from flair `Sentence`s, or directly from `texts` and a tensor of `probs`, in
+    which case `Sentence`s are only built if they are asked for
+    """
     def __init__(
         self,
-        sentences:List[Sentence], # A list of flair `Sentence`'s
-        class_names:list = None # A potential list of class names
+        sentences:List[Sentence] = None, # A list of flair `Sentence`'s
+        class_names:list = None, # A potential list of class names
+        texts:List[str] = None, # The original texts, used in place of `sentences`
+        probs:tensor = None, # A tensor of probabilities with one row per text, used in place of `sentences`
+        classes:list = None # The label of each column in `probs`
     ):
+        if sentences is None and (texts is None or probs is None or classes is None):
+            raise ValueError("Either `sentences` or `texts`, `probs`, and `classes` must be passed")
         super().__init__(sentences)
-        self.classes = sentences[0].get_label_names()
+        self._texts, self._probs = texts, probs
+        self._predictions = None
+        self.classes = classes if sentences is None else sentences[0].get_label_names()
         self.class_names = class_names
 
     @property
-    def probabilities(self) -> List[List[tensor]]:
+    def sentences(self) -> List[Sentence]:
+        "The predictions as flair `Sentence`s, built on first access"
+        if self._sentences is None:
+            self._sentences = []
+            for text, probs in zip(self._texts, self._probs.tolist()):
+                sentence = Sentence(text)
+                for label, score in zip(self.classes, probs):
+                    sentence.add_label(typename='sc', value=label, score=score)
+                self._sentences.append(sentence)
+        return self._sentences
+
+    @property
+    def inputs(self) -> List[str]:
+        "The original text inputs"
+        if self._texts is not None: return self._texts
+        return super().inputs
+
+    @property
+    def tokenized_inputs(self) -> List[str]:
+        "The original tokenized inputs"
+        return [s.to_tokenized_string() for s in self.sentences]
+
+    @property
+    def probabilities(self) -> tensor:
         """
-        The probabilities returned for each classification
+        The probabilities returned for each classification, as a (inputs x classes) tensor
         """
-        return torch.stack([tensor(list(map(lambda x: x.score, i.get_labels()))) for i in self._sentences], dim=0)
+        if self._probs is None:
+            self._probs = torch.stack([tensor([l.score for l in s.get_labels()]) for s in self._sentences], dim=0)
+        return self._probs
 
     @property
     def predictions(self) -> List[str]:
         """
         A list of the best classification for each input
         """
-        if self.class_names is not None:
-            return [self.class_names[p.argmax()] for p in self.probabilities]
-        return [max(s.labels, key=lambda x: x.score).value for s in self._sentences]
+        if self._predictions is None:
+            if self.class_names is None and self._texts is None:
+                # Single-label flair models may return a different label for each `Sentence`
+                self._predictions = [max(s.labels, key=lambda x: x.score).value for s in self._sentences]
+            else:
+                names = ifnone(self.class_names, self.classes)
+                self._predictions = [names[i] for i in self.probabilities.argmax(dim=-1).tolist()]
+        return self._predictions
+
+    def topk(
+        self,
+        k:int = 1 # The number of classes to return for each input
+    ) -> List[List[Tuple[str, float]]]: # A list of `(class, probability)` pairs for each input
+        "The `k` most likely classes for each input, ordered from most to least likely"
+        names = ifnone(self.class_names, self.classes)
+        probs, idxs = self.probabilities.topk(min(k, self.probabilities.shape[-1]), dim=-1)
+        return [
+            [(names[i], p) for i, p in zip(row_idxs, row_probs)]
+            for row_idxs, row_probs in zip(idxs.tolist(), probs.tolist())
+        ]
 
     def to_dict(
         self,
@@ -93,7 +148,7 @@ class SequenceResult(SentenceResult):
 
         if detail_level == 'high':
             # Add original `Sentences`
-            o['sentences'] = self._sentences
+            o['sentences'] = self.sentences
         return o
 
 # Cell
@@ -133,12 +188,17 @@ class TransformersSequenceClassifier(AdaptiveModel):
         self,
         text: Union[List[Sentence], Sentence, List[str], str], # Sentences to run inference on
         mini_batch_size: int = 32, # Mini batch size
+        detail_level:DetailLevel = None, # A level of detail to return. If `None`, returns a list of `Sentence`s
+        class_names:list = None, # A list of labels
+        window_size:int = None, # If given, split texts into overlapping windows of at most this many tokens and pool their logits
+        stride:int = 128, # Number of tokens consecutive windows overlap by
+        pooling:str = 'mean', # How the logits of a text's windows are pooled, either "mean" or "max"
         **kwargs, # Optional arguments for the Transformers classifier
-    ) -> List[Sentence]: # Returns a list of `Sentence` predictions
+    ) -> Union[List[Sentence], dict]: # Returns a list of `Sentence` predictions, or a dictionary at `detail_level`
         "Predict method for running inference using the pre-trained sequence classifier model"
+        if pooling not in ('mean', 'max'): raise ValueError('`pooling` must either be "mean" or "max"')
         id2label = self.model.config.id2label
         sentences = text
-        results: List[Sentence] = []
 
         if not sentences: return sentences
 
@@ -151,59 +211,44 @@ class TransformersSequenceClassifier(AdaptiveModel):
         if len(sentences) == 0:
             return sentences
 
-        # reverse sort all sequences by their length
-        rev_order_len_index = sorted(
-            range(len(sentences)), key=lambda k: len(sentences[k]), reverse=True
-        )
-        original_order_index = sorted(
-            range(len(rev_order_len_index)), key=lambda k: rev_order_len_index[k]
-        )
-
-        reordered_sentences: List[Union[DataPoint, str]] = [
-            sentences[index] for index in rev_order_len_index
+        # Turn all Sentence objects into strings
+        str_sentences = [
+            sentence.to_original_text() if isinstance(sentence, Sentence) else sentence
+            for sentence in sentences
         ]
 
-        # Turn all Sentence objects into strings
-        if isinstance(reordered_sentences[0], Sentence):
-            str_reordered_sentences = [
-                sentence.to_original_text() for sentence in sentences
-            ]
+        # Batches are sorted by token length and only padded to their own longest sequence
+        if window_size is None:
+            encodings = self._tokenize(str_sentences)
         else:
-            str_reordered_sentences = reordered_sentences
-
-        dataset = self._tokenize(str_reordered_sentences)
-        dl = DataLoader(dataset, batch_size=mini_batch_size)
-        predictions: List[Tuple[str, float]] = []
+            # The windows of every text are batched together
+            input_ids = self.tokenizer(str_sentences, add_special_tokens=False)['input_ids']
+            encodings = _windowed_encodings(self.tokenizer, input_ids, window_size, stride)
+        dl, order = _bucketed_dataloader(self.tokenizer, encodings, mini_batch_size, self._input_keys)
 
         outputs, _ = super().get_preds(dl=dl)
         logits = torch.cat([o['logits'] for o in outputs])
-        predictions = torch.softmax(logits, dim=1).tolist()
 
-        for text, pred in zip(str_reordered_sentences, predictions):
-            # Initialize and assign labels to each class in each datapoint prediction
-            text_sent = Sentence(text)
-            for k, v in id2label.items():
-                text_sent.add_label(typename='sc', value=v, score=pred[k])
-            results.append(text_sent)
+        # Order predictions back into original order
+        original_order_index = sorted(range(len(order)), key=lambda k: order[k])
+        logits = logits[original_order_index]
 
-        # Order results back into original order
-        results = [results[index] for index in original_order_index]
+        if window_size is not None:
+            # Windows of the same text are next to each other
+            n_windows = torch.bincount(torch.tensor(encodings['overflow_to_sample_mapping'])).tolist()
+            windows = logits.split(n_windows)
+            logits = torch.stack([w.mean(0) if pooling == 'mean' else w.max(0).values for w in windows])
 
-        return results
+        probs = torch.softmax(logits, dim=1)
 
-    def _tokenize(
-        self, sentences: Union[List[Sentence], Sentence, List[str], str]
-    ) -> TensorDataset:
-        """ Batch tokenizes text and produces a `TensorDataset` with them """
+        classes = [id2label[k] for k in range(len(id2label))]
+        results = SequenceResult(texts=str_sentences, probs=probs, classes=classes, class_names=class_names)
 
-        # TODO: __call__ from tokenizer base class in the transformers library could automate/handle this
-        tokenized_text = self.tokenizer.batch_encode_plus(
-            sentences,
-            return_tensors='pt',
-            max_length=None,
-            add_special_tokens=True,
-        )
+        return results.sentences if detail_level is None else results.to_dict(detail_level)
 
+    @property
+    def _input_keys(self) -> tuple:
+        "The inputs `self.model` expects, in order"
         # Bart, XLM, DistilBERT, RoBERTa, and XLM-RoBERTa don't use token_type_ids
         if isinstance(
             self.model,
@@ -213,17 +258,18 @@ class TransformersSequenceClassifier(AdaptiveModel):
                 AlbertForSequenceClassification,
             ),
         ):
-            dataset = TensorDataset(
-                tokenized_text['input_ids'],
-                tokenized_text['attention_mask'],
-                tokenized_text['token_type_ids'],
-            )
-        else:
-            dataset = TensorDataset(
-                tokenized_text['input_ids'], tokenized_text['attention_mask']
-            )
+            return ('input_ids', 'attention_mask', 'token_type_ids')
+        return ('input_ids', 'attention_mask')
 
-        return dataset
+    def _tokenize(
+        self, sentences: Union[List[str], str]
+    ) -> BatchEncoding:
+        "Batch tokenizes text without padding, leaving padding to each mini-batch"
+        return self.tokenizer(
+            sentences,
+            max_length=None,
+            add_special_tokens=True,
+        )
 
 # Cell
 class FlairSequenceClassifier(AdaptiveModel):
@@ -326,6 +372,14 @@ class EasySequenceClassifier:
                     self.sequence_classifiers[name] = FlairSequenceClassifier.load(name) # Returning the first should always be non-fast
 
         classifier = self.sequence_classifiers[name]
+        if isinstance(classifier, TransformersSequenceClassifier):
+            return classifier.predict(
+                text=text,
+                mini_batch_size=mini_batch_size,
+                detail_level=detail_level,
+                class_names=class_names,
+                **kwargs,
+            )
         out = classifier.predict(
             text=text,
             mini_batch_size=mini_batch_size,
@@ -355,4 +409,27 @@ class EasySequenceClassifier:
                 **kwargs,
             )
         res = SequenceResult(out, class_names)
-        return res.to_dict(detail_level)
\ No newline at end of file
+        return res.to_dict(detail_level)
+
+
+    def predict_stream(
+        self,
+        text: Iterable[Union[Sentence, str]], # Any iterable of texts, such as the lines of a file
+        model_name_or_path: Union[str, FlairModelResult, HFModelResult] = 'en-sentiment', # The model name key or model path
+        chunk_size: int = 1024, # The number of texts held in memory and tagged at a time
+        mini_batch_size: int = 32, # The mini batch size for running inference
+        detail_level:DetailLevel = DetailLevel.Low, # A level of detail to return
+        class_names:list = None, # A list of labels
+        **kwargs, # Keyword Arguments for Flair's `TextClassifier.predict()` method params
+    ) -> Iterator[Union[List[Sentence], dict]]: # The result of `tag_text` for each chunk
+        "Lazily tags `text` in chunks of `chunk_size`, yielding the results of each chunk as soon as they are ready"
+        if isinstance(text, (str, Sentence)): text = [text]
+        for chunk in chunked(text, chunk_size):
+            yield self.tag_text(
+                chunk,
+                model_name_or_path=model_name_or_path,
+                mini_batch_size=mini_batch_size,
+                detail_level=detail_level,
+                class_names=class_names,
+                **kwargs,
+            )
\ No newline at end of file
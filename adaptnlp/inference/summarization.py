@@ -4,7 +4,7 @@ __all__ = ['logger', 'TransformersSummarizer', 'EasySummarizer']
 
 # Cell
 import logging
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterable, Iterator
 from collections import defaultdict
 
 import torch
@@ -17,13 +17,14 @@ from transformers import (
     PreTrainedModel,
     T5ForConditionalGeneration,
     BartForConditionalGeneration,
+    BatchEncoding,
 )
 
 from ..callback import GeneratorCallback
-from ..model import AdaptiveModel
+from ..model import AdaptiveModel, _bucketed_dataloader
 from ..model_hub import HFModelResult, FlairModelResult
 
-from fastcore.basics import store_attr
+from fastcore.basics import store_attr, chunked
 from fastcore.meta import delegates
 
 from fastai.callback.core import Callback, CancelBatchException
@@ -81,61 +82,47 @@ class TransformersSummarizer(AdaptiveModel):
         if isinstance(self.model, T5ForConditionalGeneration):
             text = [f'summarize: {t}' for t in text]
 
-        dataset = self._tokenize(text)
-        dl = DataLoader(dataset, batch_size=mini_batch_size)
+        # Batches are sorted by token length and only padded to their own longest sequence
+        encodings = self._tokenize(text)
+        dl, order = _bucketed_dataloader(self.tokenizer, encodings, mini_batch_size)
 
-        summaries = []
-
-        logger.info(f'Running summarizer on {len(dataset)} text sequences')
+        logger.info(f'Running summarizer on {len(order)} text sequences')
         logger.info(f'Batch size = {mini_batch_size}')
 
         cb = GeneratorCallback(num_beams, min_length, max_length, early_stopping, **kwargs)
 
         preds,_ = super().get_preds(dl=dl, cbs=[cb])
 
-        preds = apply(lambda x: x.squeeze(0), preds)
-
-        for o in preds:
-            summaries.append(
-                [
-                    self.tokenizer.decode(
-                        o,
-                        skip_special_tokens=True,
-                        clean_up_tokenization_spaces=False,
-                    )
-                ].pop()
+        summaries = []
+        for batch in preds:
+            summaries += self.tokenizer.batch_decode(
+                batch,
+                skip_special_tokens=True,
+                clean_up_tokenization_spaces=False,
             )
 
+        # Order summaries back into original order
+        original_order_index = sorted(range(len(order)), key=lambda k: order[k])
+        summaries = [summaries[index] for index in original_order_index]
+
         return {'summaries':summaries}
 
-    def _tokenize(self, text: Union[List[str], str]) -> TensorDataset:
-        "Batch tokenizes text and produces a `TensorDataset` with text"
+    def _tokenize(self, text: Union[List[str], str]) -> BatchEncoding:
+        "Batch tokenizes text without padding, leaving padding to each mini-batch"
 
         # Pre-trained Bart summarization model has a max length fo 1024 tokens for input
         if isinstance(self.model, BartForConditionalGeneration):
-            tokenized_text = self.tokenizer.batch_encode_plus(
+            return self.tokenizer(
                 text,
-                return_tensors="pt",
                 max_length=1024,
+                truncation=True,
                 add_special_tokens=True,
-                padding="max_length",
             )
-        else:
-            tokenized_text = self.tokenizer.batch_encode_plus(
-                text,
-                return_tensors="pt",
-                padding="max_length",
-                add_special_tokens=True,
-            )
-
-        # Bart doesn't use `token_type_ids`
-        dataset = TensorDataset(
-            tokenized_text["input_ids"],
-            tokenized_text["attention_mask"],
+        return self.tokenizer(
+            text,
+            add_special_tokens=True,
         )
 
-        return dataset
-
 # Cell
 class EasySummarizer:
     "Summarization Module"
@@ -169,4 +156,23 @@ class EasySummarizer:
             max_length=max_length,
             early_stopping=early_stopping,
             **kwargs,
-        )
\ No newline at end of file
+        )
+
+
+    def predict_stream(
+        self,
+        text: Iterable[str], # Any iterable of texts, such as the lines of a file
+        model_name_or_path: Union[str, HFModelResult] = "t5-small", # A model id or path to a pre-trained model repository or custom trained model directory
+        chunk_size: int = 256, # The number of texts held in memory and summarized at a time
+        mini_batch_size: int = 32, # Mini batch size
+        **kwargs, # Keyword arguments for `summarize`
+    ) -> Iterator[dict]: # The result of `summarize` for each chunk
+        "Lazily summarizes `text` in chunks of `chunk_size`, yielding the summaries of each chunk as soon as they are ready"
+        if isinstance(text, str): text = [text]
+        for chunk in chunked(text, chunk_size):
+            yield self.summarize(
+                chunk,
+                model_name_or_path=model_name_or_path,
+                mini_batch_size=mini_batch_size,
+                **kwargs,
+            )
\ No newline at end of file
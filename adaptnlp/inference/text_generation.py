@@ -4,7 +4,7 @@ __all__ = ['logger', 'TransformersTextGenerator', 'EasyTextGenerator']
 
 # Cell
 import logging
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterable, Iterator
 from collections import defaultdict
 
 import torch
@@ -24,9 +24,25 @@ from ..model_hub import HFModelResult
 
 from fastai.torch_core import apply, default_device, to_device
 
+from fastcore.basics import chunked
+
 # Cell
 logger = logging.getLogger(__name__)
 
+# Internal Cell
+def _index_past(past_key_values, idx:torch.Tensor):
+    "Selects the batch rows `idx` of every cached key and value in `past_key_values`"
+    # Newer versions of transformers wrap the cache in a `Cache` object
+    if hasattr(past_key_values, 'reorder_cache'):
+        past_key_values.reorder_cache(idx)
+        return past_key_values
+    # Each layer caches a tuple of keys and values, or before transformers 4.3 a single tensor stacking them
+    # along a first axis of 2, so the batch is its second axis
+    return tuple(
+        tuple(p.index_select(0, idx) for p in layer) if isinstance(layer, tuple) else layer.index_select(1, idx)
+        for layer in past_key_values
+    )
+
 # Cell
 class TransformersTextGenerator(AdaptiveModel):
     "Adaptive model for Transformer's Language Models"
@@ -63,8 +79,16 @@ class TransformersTextGenerator(AdaptiveModel):
         text: Union[List[str], str], # Sentences to run inference on
         mini_batch_size: int = 32, # Mini batch size
         num_tokens_to_produce: int = 50, # Number of tokens you want to generate
+        do_sample: bool = False, # Whether to sample the next token instead of picking the most likely one
+        temperature: float = 1.0, # The value used to scale the next token logits when sampling
+        top_k: int = 0, # When sampling, only sample from the `top_k` most likely tokens. 0 means no limit
+        top_p: float = 1.0, # When sampling, only sample from the most likely tokens whose probabilities add up to `top_p`
+        num_beams: int = 1, # Number of beams for beam search. 1 means no beam search
+        length_penalty: float = 1.0, # Exponent of the length a beam's score is divided by when picking the best beam
     ) -> List[str]: # A list of predicted sentences
         "Predict method for running inference using the pre-trained sequence classifier model.  Keyword arguments for parameters of the method `Transformers.PreTrainedModel.generate()` can be used as well."
+        if do_sample and temperature <= 0: raise ValueError('`temperature` must be positive when `do_sample` is set')
+        if not 0 < top_p <= 1: raise ValueError('`top_p` must be greater than 0 and at most 1')
         with torch.no_grad():
 
             # Make all inputs lists
@@ -97,6 +121,12 @@ class TransformersTextGenerator(AdaptiveModel):
                     inputs=inputs,
                     seq_len=batch[0].shape[1],
                     num_tokens_to_produce=num_tokens_to_produce,
+                    do_sample=do_sample,
+                    temperature=temperature,
+                    top_k=top_k,
+                    top_p=top_p,
+                    num_beams=num_beams,
+                    length_penalty=length_penalty,
                 )
                 results += generated_text
 
@@ -118,66 +148,158 @@ class TransformersTextGenerator(AdaptiveModel):
 
         return dataset
 
+    def _next_tokens(
+        self, logits: torch.Tensor, do_sample: bool, temperature: float, top_k: int, top_p: float
+    ) -> torch.Tensor:
+        """Picks the next token of every row of `logits`, either greedily or by sampling"""
+        if not do_sample:
+            return torch.argmax(logits, dim=-1)
+
+        logits = logits / temperature
+        if top_k > 0:
+            kth_logit = torch.topk(logits, min(top_k, logits.shape[-1]), dim=-1)[0][:, -1, None]
+            logits = logits.masked_fill(logits < kth_logit, -float("inf"))
+        if top_p < 1.0:
+            sorted_logits, sorted_idx = torch.sort(logits, descending=True, dim=-1)
+            cum_probs = torch.softmax(sorted_logits, dim=-1).cumsum(dim=-1)
+            # remove tokens once the cumulative probability is above `top_p`, always keeping the most likely one
+            sorted_to_remove = cum_probs > top_p
+            sorted_to_remove[:, 1:] = sorted_to_remove[:, :-1].clone()
+            sorted_to_remove[:, 0] = False
+            to_remove = sorted_to_remove.scatter(1, sorted_idx, sorted_to_remove)
+            logits = logits.masked_fill(to_remove, -float("inf"))
+
+        return torch.multinomial(torch.softmax(logits, dim=-1), num_samples=1).squeeze(-1)
+
     def _batch_generate(
-        self, inputs: Dict, seq_len: int, num_tokens_to_produce: int
+        self,
+        inputs: Dict,
+        seq_len: int,
+        num_tokens_to_produce: int,
+        do_sample: bool = False,
+        temperature: float = 1.0,
+        top_k: int = 0,
+        top_p: float = 1.0,
+        num_beams: int = 1,
+        length_penalty: float = 1.0,
     ) -> List[str]:
-        """Generates text data with varying text sizes"""
+        """Generates text data with varying text sizes
+
+        Rows that have finished are dropped from the batch, and generation stops once every row has finished.
+        With `num_beams > 1` every row runs a beam search and sampling settings are ignored.
+        """
         input_ids = inputs["input_ids"]
         attn_mask = inputs["attention_masks"]
+        batch_size = input_ids.shape[0]
 
         pad_token_id = self.tokenizer.pad_token_id
         eos_token_id = self.tokenizer.eos_token_id
-        eos_not_in_sents = torch.ones(input_ids.shape[0]).long().to(self.device)
 
         # we need to get the token ids of the last non-padded value
         last_non_masked_idx = torch.sum(attn_mask, dim=1) - 1
-        start_idx = (
-            (last_non_masked_idx)
-            .view(-1, 1)
-            .repeat(1, self.tokenizer.vocab_size)
-            .unsqueeze(1)
+
+        # get correct position ids, counting up to the last non-padded value and repeating it over the padding
+        position_ids = torch.minimum(
+            torch.arange(seq_len, device=self.device).unsqueeze(0),
+            last_non_masked_idx.unsqueeze(-1),
         )
 
-        # get correct position ids
-        position_ids = torch.tensor(
-            [list(range(seq_len)) for i in range(input_ids.shape[0])]
-        ).to(self.device)
-        for i, position_ids_slice in enumerate(position_ids):
-            position_ids_slice[last_non_masked_idx[i] :] = position_ids_slice[
-                last_non_masked_idx[i]
-            ]
+        # the beams of each row sit next to each other, beam `j` of row `i` is at `i * num_beams + j`
+        step_input_ids, step_position_ids = input_ids, position_ids
+        if num_beams > 1:
+            step_input_ids, step_position_ids, attn_mask, last_non_masked_idx = (
+                t.repeat_interleave(num_beams, dim=0)
+                for t in (step_input_ids, step_position_ids, attn_mask, last_non_masked_idx)
+            )
+        beam_offsets = torch.arange(num_beams, device=self.device)
+        # only the first beam of each row is alive to start with, so the first step doesn't pick duplicates
+        beam_scores = torch.zeros((batch_size, num_beams), device=self.device)
+        beam_scores[:, 1:] = -float("inf")
+        beam_lengths = torch.zeros(batch_size * num_beams, dtype=torch.long, device=self.device)
+        finished = torch.zeros(batch_size * num_beams, dtype=torch.bool, device=self.device)
+        generated = torch.full(
+            (batch_size * num_beams, num_tokens_to_produce), pad_token_id, dtype=torch.long, device=self.device
+        )
+
+        # the rows of the batch that are still generating
+        active = torch.arange(batch_size, device=self.device)
 
+        # Only the newest token is fed to the model after the first step, with the keys and values
+        # of every earlier position coming from `past_key_values`
+        past_key_values = None
         for step in range(num_tokens_to_produce):
             outputs = self.model(
-                input_ids, attention_mask=attn_mask, position_ids=position_ids
+                step_input_ids,
+                attention_mask=attn_mask,
+                position_ids=step_position_ids,
+                past_key_values=past_key_values,
+                use_cache=True,
             )
+            past_key_values = outputs.past_key_values
 
             # in the first decoding step, we want to use the 'real' last position for each sentence
             if step == 0:
-                next_token_logits = outputs[0].gather(1, start_idx).squeeze(1)
+                next_token_logits = outputs[0][torch.arange(len(step_input_ids), device=self.device), last_non_masked_idx]
             else:
                 next_token_logits = outputs[0][:, -1, :]
 
-            next_tokens = torch.argmax(next_token_logits, dim=-1)
+            # where the beams of the active rows live in `generated`, `finished` and `beam_lengths`
+            rows = (active.unsqueeze(-1) * num_beams + beam_offsets).view(-1)
 
-            # this updates which sentences have not seen an <EOS> token so far
-            # if one <EOS> token was seen the sentence is finished
-            eos_not_in_sents.mul_(next_tokens.ne(eos_token_id).long())
-
-            # either append a padding token here if <EOS> has been seen or append next token
-            tokens_to_add = next_tokens * (eos_not_in_sents) + pad_token_id * (
-                1 - eos_not_in_sents
-            )
+            if num_beams == 1:
+                next_tokens = self._next_tokens(next_token_logits, do_sample, temperature, top_k, top_p)
+                finished[rows] = next_tokens.eq(eos_token_id)
+            else:
+                log_probs = torch.log_softmax(next_token_logits, dim=-1)
+                # finished beams can only be extended with <EOS>, which leaves their score unchanged
+                log_probs[finished[rows]] = -float("inf")
+                log_probs[finished[rows], eos_token_id] = 0.
+
+                n_active, vocab_size = len(active), log_probs.shape[-1]
+                scores = beam_scores[active].unsqueeze(-1) + log_probs.view(n_active, num_beams, vocab_size)
+                top_scores, top_idx = scores.view(n_active, -1).topk(num_beams, dim=-1)
+                beam_scores[active] = top_scores
+                next_tokens = (top_idx % vocab_size).view(-1)
+
+                # reorder everything by the beam each new candidate extends
+                src = (torch.arange(n_active, device=self.device).unsqueeze(-1) * num_beams + top_idx // vocab_size).view(-1)
+                was_finished = finished[rows[src]]
+                generated[rows] = generated[rows[src]]
+                beam_lengths[rows] = beam_lengths[rows[src]] + (~was_finished).long()
+                finished[rows] = was_finished | next_tokens.eq(eos_token_id)
+                attn_mask, step_position_ids = attn_mask[src], step_position_ids[src]
+                past_key_values = _index_past(past_key_values, src)
+
+            # <EOS> and anything after it is stored as padding
+            generated[rows, step] = next_tokens.masked_fill(next_tokens.eq(eos_token_id), pad_token_id)
+
+            # drop the rows where every beam has finished, and stop once no rows are left
+            keep = ~finished[rows].view(-1, num_beams).all(dim=-1)
+            if not keep.all():
+                active = active[keep]
+                if len(active) == 0:
+                    break
+                keep_idx = keep.repeat_interleave(num_beams).nonzero().squeeze(-1)
+                next_tokens, attn_mask, step_position_ids = (
+                    next_tokens[keep_idx], attn_mask[keep_idx], step_position_ids[keep_idx]
+                )
+                past_key_values = _index_past(past_key_values, keep_idx)
 
-            # Update input_ids, attn_mask and position_ids
-            input_ids = torch.cat([input_ids, tokens_to_add.unsqueeze(-1)], dim=-1)
+            # Update the inputs of the next step, the attention mask still covers the whole sequence
+            step_input_ids = next_tokens.unsqueeze(-1)
             attn_mask = torch.cat(
                 [attn_mask, torch.ones((attn_mask.shape[0], 1)).long().to(self.device)],
                 dim=1,
             )
-            position_ids = torch.cat(
-                [position_ids, (position_ids[:, -1] + 1).unsqueeze(-1)], dim=1
-            )
+            step_position_ids = (step_position_ids[:, -1] + 1).unsqueeze(-1)
+
+        if num_beams > 1:
+            # pick the beam with the best length-normalized score from each row
+            beam_scores = beam_scores.view(-1) / beam_lengths.clamp(min=1).float() ** length_penalty
+            best = beam_scores.view(batch_size, num_beams).argmax(dim=-1)
+            generated = generated.view(batch_size, num_beams, -1)[torch.arange(batch_size, device=self.device), best]
+
+        input_ids = torch.cat([input_ids, generated], dim=-1)
 
         return [
             self.tokenizer.decode(output, skip_special_tokens=True)
@@ -197,6 +319,7 @@ class EasyTextGenerator:
         model_name_or_path: [str, HFModelResult] = "gpt2", # A model id or path to a pre-trained model repository or custom trained model directory
         mini_batch_size: int = 32, # Mini batch size
         num_tokens_to_produce: int = 50, # Number of tokens you want to generate
+        **kwargs, # Optional arguments for `TransformersTextGenerator.predict`, such as sampling or beam search settings
     ) -> List[str]: # A list of predicted sentences
         "Predict method for running inference using the pre-trained sequence classifier model. Keyword arguments for parameters of the method `Transformers.PreTrainedModel.generate()` can be used as well."
         name = getattr(model_name_or_path, 'name', model_name_or_path)
@@ -209,5 +332,25 @@ class EasyTextGenerator:
         return generator.predict(
             text=text,
             mini_batch_size=mini_batch_size,
-            num_tokens_to_produce=num_tokens_to_produce
-        )
\ No newline at end of file
+            num_tokens_to_produce=num_tokens_to_produce,
+            **kwargs,
+        )
+
+
+    def predict_stream(
+        self,
+        text: Iterable[str], # Any iterable of prompts, such as the lines of a file
+        model_name_or_path: [str, HFModelResult] = "gpt2", # A model id or path to a pre-trained model repository or custom trained model directory
+        chunk_size: int = 256, # The number of prompts held in memory and generated from at a time
+        mini_batch_size: int = 32, # Mini batch size
+        **kwargs, # Keyword arguments for `generate`
+    ) -> Iterator[dict]: # The result of `generate` for each chunk
+        "Lazily generates text from `text` in chunks of `chunk_size`, yielding the generations of each chunk as soon as they are ready"
+        if isinstance(text, str): text = [text]
+        for chunk in chunked(text, chunk_size):
+            yield self.generate(
+                chunk,
+                model_name_or_path=model_name_or_path,
+                mini_batch_size=mini_batch_size,
+                **kwargs,
+            )
\ No newline at end of file
@@ -4,7 +4,7 @@ __all__ = ['logger', 'TokenClassificationResult', 'TransformersTokenTagger', 'Fl
 
 # Cell
 import logging
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterable, Iterator, Tuple, Optional
 from collections import defaultdict, OrderedDict
 
 import numpy as np
@@ -26,12 +26,12 @@ from transformers import (
 
 from ..result import DetailLevel
 
-from ..model import AdaptiveModel, DataLoader
+from ..model import AdaptiveModel, DataLoader, _bucketed_dataloader, _windowed_encodings
 from ..model_hub import HFModelResult, FlairModelResult, FlairModelHub, HFModelHub
 
 from fastai.torch_core import to_detach, apply, to_device
 
-from fastcore.basics import Self, risinstance
+from fastcore.basics import Self, risinstance, chunked, ifnone
 from fastcore.xtras import Path
 
 # Cell
@@ -65,11 +65,9 @@ class TokenClassificationResult:
                 'tokenized_inputs':self.tokenized_inputs
             })
         if detail_level != 'high':
-            try:
-                for tag in o['tags'][0]:
-                    tag.pop('offsets')
-            except:
-                return o
+            for tags in o['tags']:
+                for tag in tags:
+                    tag.pop('offsets', None)
         return o
 
 # Cell
@@ -105,14 +103,28 @@ class TransformersTokenTagger(AdaptiveModel):
         mini_batch_size: int = 32, # Mini batch size
         grouped_entities: bool = True, # Return whole entity span strings
         detail_level:DetailLevel = DetailLevel.Low, # A level of detail to return
+        window_size:int = None, # If given, split texts into overlapping windows of at most this many tokens
+        stride:int = 128, # Number of tokens consecutive windows overlap by
         **kwargs, # Optional arguments for the Transformers tagger
     ) -> List[List[Dict]]: # Returns a list of lists of tagged entities
         "Predict method for running inference using the pre-trained token tagger model"
         if isinstance(text, str):
             text = [text]
-        results: List[Dict] = []
 
-        dataset = self._tokenize(text)
+        if window_size is not None:
+            logits, input_ids, offset_mapping, attention_mask = self._predict_windowed(text, mini_batch_size, window_size, stride)
+            results = self._generate_tagged_entities(
+                logits=logits,
+                input_ids=input_ids,
+                grouped_entities=grouped_entities,
+                offset_mapping=offset_mapping,
+                text=text,
+                attention_mask=attention_mask
+            )
+            results = TokenClassificationResult(text, input_ids, results)
+            return results.to_dict(detail_level) if detail_level is not None else detail_level
+
+        dataset, offset_mapping = self._tokenize(text)
         dl = DataLoader(dataset, batch_size=mini_batch_size)
 
         logger.info(f'Running prediction on {len(dataset)} text sequences')
@@ -120,39 +132,38 @@ class TransformersTokenTagger(AdaptiveModel):
 
         outputs,_ = super().get_preds(dl=dl)
 
-        inputs = apply(to_device, [b for b in dl], device='cpu')
-        inputs = torch.cat(*inputs)
-        inputs = apply(Self.numpy(), inputs)
-
-        outputs = torch.cat([o['logits'] for o in outputs])
-        outputs = apply(to_detach, outputs, cpu=True)
-        outputs = apply(Self.numpy(), outputs)
-
-        # Iterate through batch for tagged token predictions
-        for idx, pred in enumerate(outputs):
-            entities = pred
-            input_ids = inputs[idx]
-            tagged_entities = self._generate_tagged_entities(
-                entities=entities,
-                input_ids=input_ids,
-                grouped_entities=grouped_entities
-            )
-            results += tagged_entities
+        input_ids = torch.cat([b[0] for b in dl]).numpy()
+        attention_mask = torch.cat([b[1] for b in dl]).numpy()
+        logits = torch.cat([o['logits'] for o in outputs]).cpu()
+
+        # Decode tagged token predictions for the whole batch at once, never tagging padding
+        results = self._generate_tagged_entities(
+            logits=logits,
+            input_ids=input_ids,
+            grouped_entities=grouped_entities,
+            offset_mapping=offset_mapping,
+            text=text,
+            attention_mask=attention_mask
+        )
 
-        results = TokenClassificationResult(text, inputs, results)
+        results = TokenClassificationResult(text, input_ids, results)
 
         return results.to_dict(detail_level) if detail_level is not None else detail_level
 
     def _tokenize(
         self, sentences: Union[List[Sentence], Sentence, List[str], str]
-    ) -> TensorDataset:
-        "Batch tokenizes text and produces a `TensorDataset` with them"
+    ) -> Tuple[TensorDataset, Optional[np.ndarray]]:
+        "Batch tokenizes text and produces a `TensorDataset` with them, along with the character offsets of each token if the tokenizer is fast"
 
         tokenized_text = self.tokenizer.batch_encode_plus(
             sentences,
             return_tensors="pt",
             max_length=None,
+            padding=True,
+            return_offsets_mapping=getattr(self.tokenizer, 'is_fast', False),
         )
+        offset_mapping = tokenized_text.pop("offset_mapping", None)
+        if offset_mapping is not None: offset_mapping = offset_mapping.numpy()
 
         # Bart, XLM, DistilBERT, RoBERTa, and XLM-RoBERTa don't use token_type_ids
         if isinstance(
@@ -173,97 +184,137 @@ class TransformersTokenTagger(AdaptiveModel):
                 tokenized_text["input_ids"], tokenized_text["attention_mask"]
             )
 
-        return dataset
-
-    # `_group_entites` and `_generate_tagged_entities` modified from pipeline code snippet from Transformers
-    def _group_entities(
-        self, entities: List[dict], idx_start: int, idx_end: int
-    ) -> Dict:
-        """Returns grouped entities"""
-        # Get the last entity in the entity group
-        entity = entities[-1]["entity"]
-        scores = np.mean([entity["score"] for entity in entities])
-        tokens = [entity["word"] for entity in entities]
-
-        entity_group = {
-            "entity": entity,
-            "score": np.mean(scores),
-            "word": self.tokenizer.convert_tokens_to_string(tokens),
-            "offsets": (idx_start, idx_end),
-        }
-        return entity_group
+        return dataset, offset_mapping
 
-    def _generate_tagged_entities(
-        self, entities: np.ndarray, input_ids: np.ndarray, grouped_entities: bool = True
-    ) -> List[Dict]:
-        """Generate full list of entities given tagged token predictions and input_ids"""
-
-        score = np.exp(entities) / np.exp(entities).sum(-1, keepdims=True)
-        labels_idx = score.argmax(axis=-1)
-
-        answers = []
-        entities = []
-        entity_groups = []
-        entity_group_disagg = []
-        # Filter to labels not in `self.ignore_labels`
-        filtered_labels_idx = [
-            (idx, label_idx)
-            for idx, label_idx in enumerate(labels_idx)
-            if self.model.config.id2label[label_idx] not in ["O"]
-        ]
-
-        for idx, label_idx in filtered_labels_idx:
-            # print(tokenizer.convert_ids_to_tokens(int(input_ids[idx])))
-            entity = {
-                "word": self.tokenizer.convert_ids_to_tokens(int(input_ids[idx])),
-                "score": score[idx][label_idx].item(),
-                "entity": self.model.config.id2label[label_idx],
-                "index": idx,
-            }
-            last_idx, _ = filtered_labels_idx[-1]
-            if grouped_entities:
-                if not entity_group_disagg:
-                    entity_group_disagg += [entity]
-                    if idx == last_idx:
-                        entity_groups += [
-                            self._group_entities(
-                                entity_group_disagg, idx - len(entity_group_disagg), idx
-                            )
-                        ]
-                    continue
-
-                # If the current entity is similar and adjacent to the previous entity, append it to the disaggregated entity group
-                if (
-                    entity["entity"] == entity_group_disagg[-1]["entity"]
-                    and entity["index"] == entity_group_disagg[-1]["index"] + 1
-                ):
-                    entity_group_disagg += [entity]
-                    # Group the entities at the last entity
-                    if idx == last_idx:
-                        entity_groups += [
-                            self._group_entities(
-                                entity_group_disagg, idx - len(entity_group_disagg), idx
-                            )
-                        ]
-                # If the current entity is different from the previous entity, aggregate the disaggregated entity group
-                else:
-                    entity_groups += [
-                        self._group_entities(
-                            entity_group_disagg,
-                            entity_group_disagg[-1]["index"] - len(entity_group_disagg),
-                            entity_group_disagg[-1]["index"],
-                        )
-                    ]
-                    entity_group_disagg = [entity]
-
-            entities += [entity]
-
-        # Append
-        if grouped_entities:
-            answers += [entity_groups]
-        else:
-            answers += [entities]
+    def _predict_windowed(
+        self,
+        text: List[str], # Sentences to run inference on
+        mini_batch_size: int, # Mini batch size
+        window_size: int, # Maximum number of tokens in a window, including special tokens
+        stride: int # Number of tokens consecutive windows overlap by
+    ) -> Tuple[torch.Tensor, np.ndarray, Optional[np.ndarray], np.ndarray]:
+        """Runs the model over overlapping windows of every text, batched together, and keeps the logits of each token from
+        the window where it has the most context. Returns the padded logits, input_ids, character offsets and attention
+        mask of every whole text, without special tokens"""
+        is_fast = getattr(self.tokenizer, 'is_fast', False)
+        tokenized_text = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=is_fast)
+        encodings = _windowed_encodings(self.tokenizer, tokenized_text['input_ids'], window_size, stride)
+        dl, order = _bucketed_dataloader(self.tokenizer, encodings, mini_batch_size)
+
+        logger.info(f'Running prediction on {len(order)} windows of {len(text)} text sequences')
+        logger.info(f'Batch size = {mini_batch_size}')
 
+        outputs,_ = super().get_preds(dl=dl)
+        window_logits = [row for o in outputs for row in o['logits'].cpu()]
+
+        # Score every token by its distance to the closer edge of its window, as in SQuAD's `_check_is_max_context`
+        samples, positions, scores, rows = [], [], [], []
+        for logits, idx in zip(window_logits, order):
+            token_positions = np.array(encodings['token_positions'][idx], dtype=np.int64)
+            window_idx = np.flatnonzero(token_positions >= 0)
+            pos = token_positions[window_idx]
+            samples.append(np.full(len(pos), encodings['overflow_to_sample_mapping'][idx]))
+            positions.append(pos)
+            scores.append(np.minimum(pos - pos[:1], pos[-1:] - pos) + 0.01 * len(pos))
+            rows.append(logits[window_idx])
+        samples, positions, scores = map(np.concatenate, (samples, positions, scores))
+        rows = torch.cat(rows)
+
+        # Keep the highest scoring window of every token
+        keep = np.lexsort((-scores, positions, samples))
+        first = np.ones(len(keep), dtype=bool)
+        first[1:] = (samples[keep][1:] != samples[keep][:-1]) | (positions[keep][1:] != positions[keep][:-1])
+        keep = keep[first]
+
+        lengths = [len(ids) for ids in tokenized_text['input_ids']]
+        n, max_len = len(text), max(lengths)
+        logits = torch.zeros(n, max_len, rows.shape[-1])
+        logits[torch.as_tensor(samples[keep]), torch.as_tensor(positions[keep])] = rows[torch.as_tensor(keep)]
+
+        input_ids = np.full((n, max_len), ifnone(self.tokenizer.pad_token_id, 0), dtype=np.int64)
+        attention_mask = np.zeros((n, max_len), dtype=np.int64)
+        offset_mapping = np.zeros((n, max_len, 2), dtype=np.int64) if is_fast else None
+        for i, length in enumerate(lengths):
+            if length == 0: continue
+            input_ids[i, :length] = tokenized_text['input_ids'][i]
+            attention_mask[i, :length] = 1
+            if is_fast: offset_mapping[i, :length] = tokenized_text['offset_mapping'][i]
+        return logits, input_ids, offset_mapping, attention_mask
+
+    # `_generate_tagged_entities` modified from pipeline code snippet from Transformers
+    def _generate_tagged_entities(
+        self,
+        logits: torch.Tensor, # Tagged token predictions of a batch, shaped `(batch, seq_len, num_labels)`
+        input_ids: np.ndarray, # The input ids of the batch, shaped `(batch, seq_len)`
+        grouped_entities: bool = True, # Whether to merge adjacent tokens sharing a label into one entity
+        offset_mapping: np.ndarray = None, # The `(start, end)` character offsets of each token, shaped `(batch, seq_len, 2)`
+        text: List[str] = None, # The original text of each sentence, required with `offset_mapping`
+        attention_mask: np.ndarray = None # If given, tokens where it is 0 are never tagged
+    ) -> List[List[Dict]]: # A list of tagged entities for each sentence
+        """Generate full list of entities for every sentence in a batch given tagged token predictions and input_ids
+
+        With `offset_mapping`, entity `offsets` are character spans into `text` and special tokens are never tagged,
+        otherwise they are token indices"""
+        scores, labels_idx = torch.softmax(logits.float(), dim=-1).max(dim=-1)
+        scores, labels_idx = scores.numpy(), labels_idx.numpy()
+
+        # Filter to labels not in `["O"]`, keeping row-major order
+        id2label = self.model.config.id2label
+        is_entity = np.array([id2label[i] not in ["O"] for i in range(len(id2label))])
+        tagged = is_entity[labels_idx]
+        if attention_mask is not None: tagged &= attention_mask.astype(bool)
+        rows, cols = np.nonzero(tagged)
+        if offset_mapping is not None:
+            # Special and padding tokens map to an empty span of text
+            spans = offset_mapping[rows, cols]
+            has_text = spans[:, 1] > spans[:, 0]
+            rows, cols, spans = rows[has_text], cols[has_text], spans[has_text]
+        labels_idx, scores = labels_idx[rows, cols], scores[rows, cols]
+
+        answers = [[] for _ in range(len(input_ids))]
+        if not grouped_entities:
+            words = self.tokenizer.convert_ids_to_tokens(input_ids[rows, cols].tolist())
+            for i, (row, idx, label_idx, score, word) in enumerate(zip(rows.tolist(), cols.tolist(), labels_idx.tolist(), scores.tolist(), words)):
+                entity = {
+                    "word": word,
+                    "score": score,
+                    "entity": id2label[label_idx],
+                    "index": idx,
+                }
+                if offset_mapping is not None: entity["offsets"] = tuple(spans[i].tolist())
+                answers[row].append(entity)
+            return answers
+        if len(rows) == 0: return answers
+
+        # A new group starts on a new sentence, after a gap, or when the label changes
+        new_group = np.ones(len(rows), dtype=bool)
+        new_group[1:] = (rows[1:] != rows[:-1]) | (cols[1:] != cols[:-1] + 1) | (labels_idx[1:] != labels_idx[:-1])
+        starts = np.flatnonzero(new_group)
+        lengths = np.diff(np.append(starts, len(rows)))
+        group_scores = np.add.reduceat(scores.astype(np.float64), starts) / lengths
+
+        if offset_mapping is not None:
+            # Each group spans from the start of its first token to the end of its last
+            char_starts, char_ends = spans[starts, 0].tolist(), spans[starts + lengths - 1, 1].tolist()
+            for start, score, char_start, char_end in zip(starts.tolist(), group_scores.tolist(), char_starts, char_ends):
+                row = rows[start]
+                answers[row].append({
+                    "entity": id2label[labels_idx[start]],
+                    "score": score,
+                    "word": text[row][char_start:char_end],
+                    "offsets": (char_start, char_end),
+                })
+            return answers
+
+        words = self.tokenizer.convert_ids_to_tokens(input_ids[rows, cols].tolist())
+        ends = cols[starts + lengths - 1]
+        for start, length, end, score in zip(starts.tolist(), lengths.tolist(), ends.tolist(), group_scores.tolist()):
+            answers[rows[start]].append({
+                "entity": id2label[labels_idx[start]],
+                "score": score,
+                "word": self.tokenizer.convert_tokens_to_string(words[start:start+length]),
+                "offsets": (end - length, end),
+            })
         return answers
 
 # Cell
@@ -363,6 +414,7 @@ class EasyTokenTagger:
             return tagger.predict(
                 text=text,
                 mini_batch_size=mini_batch_size,
+                detail_level=detail_level,
                 **kwargs
             )
         else:
@@ -391,4 +443,25 @@ class EasyTokenTagger:
                 mini_batch_size=mini_batch_size,
                 **kwargs,
             )
-        return sentences
\ No newline at end of file
+        return sentences
+
+
+    def predict_stream(
+        self,
+        text: Iterable[Union[Sentence, str]], # Any iterable of texts, such as the lines of a file
+        model_name_or_path: Union[str, FlairModelResult, HFModelResult] = "ner-ontonotes", # The hosted model name key or model path
+        chunk_size: int = 1024, # The number of texts held in memory and tagged at a time
+        mini_batch_size: int = 32, # The mini batch size for running inference
+        detail_level:DetailLevel = DetailLevel.Low, # The level of detail to return on a TransformerTagger
+        **kwargs, # Keyword arguments for Flair's `SequenceTagger.predict()` method
+    ) -> Iterator[Union[List[Sentence], dict]]: # The result of `tag_text` for each chunk
+        "Lazily tags `text` in chunks of `chunk_size`, yielding the results of each chunk as soon as they are ready"
+        if isinstance(text, (str, Sentence)): text = [text]
+        for chunk in chunked(text, chunk_size):
+            yield self.tag_text(
+                chunk,
+                model_name_or_path=model_name_or_path,
+                mini_batch_size=mini_batch_size,
+                detail_level=detail_level,
+                **kwargs,
+            )
\ No newline at end of file
@@ -4,7 +4,7 @@ __all__ = ['logger', 'TranslationResult', 'TransformersTranslator', 'EasyTransla
 
 # Cell
 import logging
-from typing import List, Dict, Union
+from typing import List, Dict, Union, Iterable, Iterator
 from collections import defaultdict, OrderedDict
 
 import torch
@@ -16,14 +16,15 @@ from transformers import (
     PreTrainedTokenizer,
     PreTrainedModel,
     T5ForConditionalGeneration,
+    BatchEncoding,
 )
 
-from ..model import AdaptiveModel
+from ..model import AdaptiveModel, _bucketed_dataloader
 from ..callback import GeneratorCallback
 
 from fastai.torch_core import apply, to_device
 
-from fastcore.basics import Self
+from fastcore.basics import Self, chunked
 from ..model_hub import HFModelResult, FlairModelResult, HFModelHub, FlairModelHub
 from ..result import DetailLevel
 
@@ -116,54 +117,44 @@ class TransformersTranslator(AdaptiveModel):
         if isinstance(self.model, T5ForConditionalGeneration):
             text = [f'{t5_prefix}: {t}' for t in text]
 
-        dataset = self._tokenize(text)
-        dl = DataLoader(dataset, batch_size=mini_batch_size)
-        translations = []
+        # Batches are sorted by token length and only padded to their own longest sequence
+        encodings = self._tokenize(text)
+        dl, order = _bucketed_dataloader(self.tokenizer, encodings, mini_batch_size)
 
-        logger.info(f'Running translator on {len(dataset)} text sequences')
+        logger.info(f'Running translator on {len(order)} text sequences')
         logger.info(f'Batch size = {mini_batch_size}')
 
         cb = GeneratorCallback(num_beams, min_length, max_length, early_stopping, **kwargs)
 
         preds,_ = super().get_preds(dl=dl, cbs=[cb])
 
-        preds = apply(Self.squeeze(0), preds)
-
-        for o in preds:
-            translations.append(
-                [
-                    self.tokenizer.decode(
-                        o,
-                        skip_special_tokens=True,
-                        clean_up_tokenization_spaces=False,
-                    )
-                ].pop()
+        translations = []
+        for batch in preds:
+            translations += self.tokenizer.batch_decode(
+                batch,
+                skip_special_tokens=True,
+                clean_up_tokenization_spaces=False,
             )
 
+        # Order translations back into original order
+        original_order_index = sorted(range(len(order)), key=lambda k: order[k])
+        translations = [translations[index] for index in original_order_index]
+
         languages = t5_prefix.strip('translate ').split(' to ')
 
         res = TranslationResult(text, *languages, translations)
 
         return res if detail_level is None else res.to_dict(detail_level)
 
-    def _tokenize(self, text: Union[List[str], str]) -> TensorDataset:
-        """ Batch tokenizes text and produces a `TensorDataset` with text """
-
-        tokenized_text = self.tokenizer.batch_encode_plus(
+    def _tokenize(self, text: Union[List[str], str]) -> BatchEncoding:
+        "Batch tokenizes text without padding, leaving padding to each mini-batch"
+        return self.tokenizer(
             text,
-            return_tensors='pt',
             max_length=512,
-            padding='max_length',
+            truncation=True,
             add_special_tokens=True,
         )
 
-        # Bart doesn't use `token_type_ids`
-        dataset = TensorDataset(
-            tokenized_text['input_ids'],
-            tokenized_text['attention_mask'],
-        )
-        return dataset
-
 # Cell
 class EasyTranslator:
     "Translation Module"
@@ -201,4 +192,25 @@ class EasyTranslator:
             max_length=max_length,
             early_stopping=early_stopping,
             **kwargs,
-        )
\ No newline at end of file
+        )
+
+
+    def predict_stream(
+        self,
+        text: Iterable[str], # Any iterable of texts, such as the lines of a file
+        model_name_or_path: str = "t5-small", # A model id or path to a pre-trained model repository or custom trained model directory
+        chunk_size: int = 256, # The number of texts held in memory and translated at a time
+        mini_batch_size: int = 32, # Mini batch size
+        detail_level=DetailLevel.Low, # The level of detail to return
+        **kwargs, # Keyword arguments for `translate`
+    ) -> Iterator[Union[TranslationResult, dict]]: # The result of `translate` for each chunk
+        "Lazily translates `text` in chunks of `chunk_size`, yielding the translations of each chunk as soon as they are ready"
+        if isinstance(text, str): text = [text]
+        for chunk in chunked(text, chunk_size):
+            yield self.translate(
+                chunk,
+                model_name_or_path=model_name_or_path,
+                mini_batch_size=mini_batch_size,
+                detail_level=detail_level,
+                **kwargs,
+            )
\ No newline at end of file
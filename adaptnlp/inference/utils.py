@@ -2,8 +2,8 @@
 
 __all__ = ['logger', 'normalize_answer', 'get_tokens', 'compute_exact', 'compute_f1', 'get_raw_scores',
            'apply_no_ans_threshold', 'make_eval_dict', 'merge_eval', 'find_best_thresh_v2', 'find_all_best_thresh_v2',
-           'find_best_thresh', 'find_all_best_thresh', 'squad_evaluate', 'get_final_text', 'compute_predictions_logits',
-           'compute_predictions_log_probs']
+           'find_best_thresh', 'find_all_best_thresh', 'squad_evaluate', 'squad_evaluate_batch', 'get_final_text',
+           'compute_predictions_logits', 'compute_predictions_log_probs']
 
 # Cell
 """Very heavily inspired by the official evaluation script for SQuAD version 2.0 which was
@@ -19,38 +19,30 @@ Additional modifications for adaptnlp include making prediction writes optional
 
 
 import collections
+import functools
 import json
 import logging
 import math
 import re
 import string
 
+import numpy as np
+
 from transformers.models.bert import BasicTokenizer
 
 # Cell
 logger = logging.getLogger(__name__)
 
+# Internal Cell
+_ARTICLES = re.compile(r"\b(a|an|the)\b", re.UNICODE)
+_REMOVE_PUNCTUATION = str.maketrans("", "", string.punctuation)
+
 # Cell
 def normalize_answer(
     s:str # Some text
 ) -> str:
     "Lowercase text and remove punctuation, articles and extra whitespace."
-
-    def remove_articles(text):
-        regex = re.compile(r"\b(a|an|the)\b", re.UNICODE)
-        return re.sub(regex, " ", text)
-
-    def white_space_fix(text):
-        return " ".join(text.split())
-
-    def remove_punc(text):
-        exclude = set(string.punctuation)
-        return "".join(ch for ch in text if ch not in exclude)
-
-    def lower(text):
-        return text.lower()
-
-    return white_space_fix(remove_articles(remove_punc(lower(s))))
+    return " ".join(_ARTICLES.sub(" ", s.lower().translate(_REMOVE_PUNCTUATION)).split())
 
 # Cell
 def get_tokens(
@@ -88,6 +80,39 @@ def compute_f1(
     f1 = (2 * precision * recall) / (precision + recall)
     return f1
 
+# Internal Cell
+@functools.lru_cache(maxsize=2**17)
+def _normalized_gold(answers:tuple) -> tuple:
+    """The normalized text, token multiset and number of tokens of every gold answer in `answers` that isn't empty
+    once normalized. Unanswerable questions get the empty string as their only answer. Cached, as the same gold
+    answers are scored against every set of predictions"""
+    gold = []
+    for answer in answers:
+        normalized = normalize_answer(answer)
+        if normalized:
+            tokens = normalized.split()
+            gold.append((normalized, collections.Counter(tokens), len(tokens)))
+    return tuple(gold) or (("", collections.Counter(), 0),)
+
+def _score_prediction(gold:tuple, prediction:str) -> tuple:
+    "The exact and F1 scores of `prediction` against the best matching answer of `gold`, as built by `_normalized_gold`"
+    normalized = normalize_answer(prediction)
+    tokens = normalized.split()
+    pred_counts, num_pred = collections.Counter(tokens), len(tokens)
+    exact, f1 = 0, 0
+    for gold_normalized, gold_counts, num_gold in gold:
+        exact = max(exact, int(gold_normalized == normalized))
+        if num_gold == 0 or num_pred == 0:
+            # If either is no-answer, then F1 is 1 if they agree, 0 otherwise
+            f1 = max(f1, int(num_gold == num_pred))
+            continue
+        num_same = sum((gold_counts & pred_counts).values())
+        if num_same == 0: continue
+        precision = 1.0 * num_same / num_pred
+        recall = 1.0 * num_same / num_gold
+        f1 = max(f1, (2 * precision * recall) / (precision + recall))
+    return exact, f1
+
 # Cell
 def get_raw_scores(
     examples:list, # Ground truth examples
@@ -99,23 +124,13 @@ def get_raw_scores(
 
     for example in examples:
         qas_id = example.qas_id
-        gold_answers = [
-            answer["text"]
-            for answer in example.answers
-            if normalize_answer(answer["text"])
-        ]
-
-        if not gold_answers:
-            # For unanswerable questions, only correct answer is empty string
-            gold_answers = [""]
-
         if qas_id not in preds:
             print("Missing prediction for %s" % qas_id)
             continue
 
-        prediction = preds[qas_id]
-        exact_scores[qas_id] = max(compute_exact(a, prediction) for a in gold_answers)
-        f1_scores[qas_id] = max(compute_f1(a, prediction) for a in gold_answers)
+        # Every gold answer and the prediction are only normalized once
+        gold = _normalized_gold(tuple(answer["text"] for answer in example.answers))
+        exact_scores[qas_id], f1_scores[qas_id] = _score_prediction(gold, preds[qas_id])
 
     return exact_scores, f1_scores
 
@@ -168,6 +183,46 @@ def merge_eval(main_eval, new_eval, prefix):
     for k in new_eval:
         main_eval["%s_%s" % (prefix, k)] = new_eval[k]
 
+# Internal Cell
+def _sequential_sum(x:np.ndarray) -> np.ndarray:
+    "The sum of `x` along its first axis, added up in order like the dict-based sums it replaces so results don't change"
+    return np.cumsum(x, axis=0)[-1] if len(x) else np.zeros(x.shape[1:])
+
+def _best_thresholds(
+    na_probs:np.ndarray, # The no-answer probability of every question
+    has_answer:np.ndarray, # Whether every question has an answer
+    pred_has_answer:np.ndarray, # Whether an answer was predicted for every question
+    scores:np.ndarray, # One column of scores per metric, such as exact and F1, with a row per question
+    num_no_ans:int # Number of unanswerable questions
+) -> tuple:
+    """
+    Single-pass threshold search: sorts questions by `na_probs` once, and walks the cumulative score curve of every
+    metric together. Returns the best total score of each metric, the no-answer probability threshold reaching it,
+    and the summed scores of the questions that have an answer
+    """
+    order = np.argsort(na_probs, kind="stable")
+    # Questions above the threshold are predicted as unanswerable, which only loses a point for a wrong non-empty answer
+    diffs = np.where(has_answer[:, None], scores, np.where(pred_has_answer, -1.0, 0.0)[:, None])[order]
+    curves = np.cumsum(np.concatenate([np.full((1, scores.shape[1]), float(num_no_ans)), diffs]), axis=0)
+    # `argmax` keeps the first best threshold, like the strict comparison of a running best
+    best = curves.argmax(0)
+    thresholds = np.concatenate([[0.0], na_probs[order]])[best]
+    return curves[best, np.arange(scores.shape[1])], thresholds, _sequential_sum(scores[order][has_answer[order]])
+
+def _find_best_thresholds(preds, all_scores, na_probs, qid_to_has_ans) -> tuple:
+    "Runs `_best_thresholds` over every dict of scores in `all_scores` at once, and scales the results like `find_best_thresh_v2`"
+    qids = [qid for qid in na_probs if qid in all_scores[0]]
+    _array = lambda get, dtype: np.fromiter(map(get, qids), dtype=dtype, count=len(qids))
+    best, thresholds, has_ans_scores = _best_thresholds(
+        _array(na_probs.__getitem__, np.float64),
+        _array(qid_to_has_ans.__getitem__, bool),
+        _array(lambda qid: bool(preds[qid]), bool),
+        np.stack([_array(scores.__getitem__, np.float64) for scores in all_scores], axis=1),
+        sum(not has_ans for has_ans in qid_to_has_ans.values()),
+    )
+    has_ans_cnt = sum(map(bool, map(qid_to_has_ans.__getitem__, na_probs)))
+    return 100.0 * best / len(all_scores[0]), thresholds, 1.0 * has_ans_scores / max(has_ans_cnt, 1)
+
 # Cell
 def find_best_thresh_v2(
     preds, # Model predictions
@@ -176,41 +231,8 @@ def find_best_thresh_v2(
     qid_to_has_ans
 ):
     "Finds the best score threshold"
-    num_no_ans = sum(1 for k in qid_to_has_ans if not qid_to_has_ans[k])
-    cur_score = num_no_ans
-    best_score = cur_score
-    best_thresh = 0.0
-    qid_list = sorted(na_probs, key=lambda k: na_probs[k])
-    for i, qid in enumerate(qid_list):
-        if qid not in scores:
-            continue
-        if qid_to_has_ans[qid]:
-            diff = scores[qid]
-        else:
-            if preds[qid]:
-                diff = -1
-            else:
-                diff = 0
-        cur_score += diff
-        if cur_score > best_score:
-            best_score = cur_score
-            best_thresh = na_probs[qid]
-
-    has_ans_score, has_ans_cnt = 0, 0
-    for qid in qid_list:
-        if not qid_to_has_ans[qid]:
-            continue
-        has_ans_cnt += 1
-
-        if qid not in scores:
-            continue
-        has_ans_score += scores[qid]
-
-    return (
-        100.0 * best_score / len(scores),
-        best_thresh,
-        1.0 * has_ans_score / has_ans_cnt,
-    )
+    best_scores, thresholds, has_ans_scores = _find_best_thresholds(preds, [scores], na_probs, qid_to_has_ans)
+    return best_scores[0], thresholds[0], has_ans_scores[0]
 
 # Cell
 def find_all_best_thresh_v2(
@@ -222,11 +244,8 @@ def find_all_best_thresh_v2(
     qid_to_has_ans
 ):
     "Finds the best threshold for all inputs"
-    best_exact, exact_thresh, has_ans_exact = find_best_thresh_v2(
-        preds, exact_raw, na_probs, qid_to_has_ans
-    )
-    best_f1, f1_thresh, has_ans_f1 = find_best_thresh_v2(
-        preds, f1_raw, na_probs, qid_to_has_ans
+    (best_exact, best_f1), (exact_thresh, f1_thresh), (has_ans_exact, has_ans_f1) = _find_best_thresholds(
+        preds, [exact_raw, f1_raw], na_probs, qid_to_has_ans
     )
     main_eval["best_exact"] = best_exact
     main_eval["best_exact_thresh"] = exact_thresh
@@ -243,26 +262,8 @@ def find_best_thresh(
     qid_to_has_ans
 ):
     "Finds best answer threshold"
-    num_no_ans = sum(1 for k in qid_to_has_ans if not qid_to_has_ans[k])
-    cur_score = num_no_ans
-    best_score = cur_score
-    best_thresh = 0.0
-    qid_list = sorted(na_probs, key=lambda k: na_probs[k])
-    for _, qid in enumerate(qid_list):
-        if qid not in scores:
-            continue
-        if qid_to_has_ans[qid]:
-            diff = scores[qid]
-        else:
-            if preds[qid]:
-                diff = -1
-            else:
-                diff = 0
-        cur_score += diff
-        if cur_score > best_score:
-            best_score = cur_score
-            best_thresh = na_probs[qid]
-    return 100.0 * best_score / len(scores), best_thresh
+    best_scores, thresholds, _ = _find_best_thresholds(preds, [scores], na_probs, qid_to_has_ans)
+    return best_scores[0], thresholds[0]
 
 # Cell
 def find_all_best_thresh(
@@ -274,16 +275,50 @@ def find_all_best_thresh(
     qid_to_has_ans
 ):
     "Finds the best threshold for all inputs"
-    best_exact, exact_thresh = find_best_thresh(
-        preds, exact_raw, na_probs, qid_to_has_ans
+    (best_exact, best_f1), (exact_thresh, f1_thresh), _ = _find_best_thresholds(
+        preds, [exact_raw, f1_raw], na_probs, qid_to_has_ans
     )
-    best_f1, f1_thresh = find_best_thresh(preds, f1_raw, na_probs, qid_to_has_ans)
 
     main_eval["best_exact"] = best_exact
     main_eval["best_exact_thresh"] = exact_thresh
     main_eval["best_f1"] = best_f1
     main_eval["best_f1_thresh"] = f1_thresh
 
+# Internal Cell
+def _evaluate_arrays(
+    scores:np.ndarray, # The exact and F1 score of every predicted question
+    has_answer:np.ndarray, # Whether every predicted question has an answer
+    pred_has_answer:np.ndarray, # Whether an answer was predicted for every question
+    na_probs:np.ndarray, # The no-answer probability of every predicted question
+    na_order:np.ndarray, # The rows of the questions in `na_probs`, in the order the no-answer probabilities were given
+    num_no_ans:int, # Number of unanswerable questions, predicted or not
+    no_answer_probability_threshold:float,
+    find_thresholds:bool=True # Whether to search for the best no-answer probability thresholds
+) -> collections.OrderedDict:
+    "The `squad_evaluate` scores of a set of predictions, with their has-answer and no-answer breakdowns, computed over arrays"
+    # Questions predicted as unanswerable score 1 when they are, whatever the predicted span
+    no_answer = na_probs > no_answer_probability_threshold
+    thresholded = np.where(no_answer[:, None], (~has_answer).astype(np.float64)[:, None], scores)
+
+    def _eval_dict(mask):
+        total = int(mask.sum())
+        exact, f1 = 100.0 * _sequential_sum(thresholded[mask]) / total
+        return collections.OrderedDict([("exact", exact), ("f1", f1), ("total", total)])
+
+    evaluation = _eval_dict(np.ones_like(has_answer))
+    for prefix, mask in (("HasAns", has_answer), ("NoAns", ~has_answer)):
+        if mask.any(): merge_eval(evaluation, _eval_dict(mask), prefix)
+
+    if find_thresholds:
+        (best_exact, best_f1), (exact_thresh, f1_thresh), _ = _best_thresholds(
+            na_probs[na_order], has_answer[na_order], pred_has_answer[na_order], scores[na_order], num_no_ans
+        )
+        evaluation["best_exact"] = 100.0 * best_exact / len(scores)
+        evaluation["best_exact_thresh"] = exact_thresh
+        evaluation["best_f1"] = 100.0 * best_f1 / len(scores)
+        evaluation["best_f1_thresh"] = f1_thresh
+    return evaluation
+
 # Cell
 def squad_evaluate(
     examples, # Ground truth examples
@@ -292,48 +327,42 @@ def squad_evaluate(
     no_answer_probability_threshold=1.0
 ):
     "Evalues SQuAD scores on inputs"
-    qas_id_to_has_answer = {
-        example.qas_id: bool(example.answers) for example in examples
-    }
-    has_answer_qids = [
-        qas_id for qas_id, has_answer in qas_id_to_has_answer.items() if has_answer
-    ]
-    no_answer_qids = [
-        qas_id for qas_id, has_answer in qas_id_to_has_answer.items() if not has_answer
-    ]
-
-    if no_answer_probs is None:
-        no_answer_probs = {k: 0.0 for k in preds}
-
-    exact, f1 = get_raw_scores(examples, preds)
-
-    exact_threshold = apply_no_ans_threshold(
-        exact, no_answer_probs, qas_id_to_has_answer, no_answer_probability_threshold
-    )
-    f1_threshold = apply_no_ans_threshold(
-        f1, no_answer_probs, qas_id_to_has_answer, no_answer_probability_threshold
-    )
-
-    evaluation = make_eval_dict(exact_threshold, f1_threshold)
-
-    if has_answer_qids:
-        has_ans_eval = make_eval_dict(
-            exact_threshold, f1_threshold, qid_list=has_answer_qids
-        )
-        merge_eval(evaluation, has_ans_eval, "HasAns")
-
-    if no_answer_qids:
-        no_ans_eval = make_eval_dict(
-            exact_threshold, f1_threshold, qid_list=no_answer_qids
-        )
-        merge_eval(evaluation, no_ans_eval, "NoAns")
-
-    if no_answer_probs:
-        find_all_best_thresh(
-            evaluation, preds, exact, f1, no_answer_probs, qas_id_to_has_answer
-        )
+    return squad_evaluate_batch(examples, [preds], [no_answer_probs], no_answer_probability_threshold)[0]
 
-    return evaluation
+# Cell
+def squad_evaluate_batch(
+    examples, # Ground truth examples
+    all_preds:list, # Several sets of model predictions, such as the predictions of each checkpoint during model selection
+    all_no_answer_probs:list=None, # The no-answer probabilities of each set of predictions
+    no_answer_probability_threshold=1.0
+) -> list: # The evaluation of each set of predictions
+    "Evaluates the SQuAD scores of several sets of predictions at once, normalizing the gold answers of `examples` a single time"
+    qas_ids = [example.qas_id for example in examples]
+    has_answer = np.array([bool(example.answers) for example in examples], dtype=bool)
+    num_no_ans = int((~has_answer).sum())
+    golds = [_normalized_gold(tuple(answer["text"] for answer in example.answers)) for example in examples]
+    if all_no_answer_probs is None: all_no_answer_probs = [None] * len(all_preds)
+
+    evaluations = []
+    for preds, no_answer_probs in zip(all_preds, all_no_answer_probs):
+        if no_answer_probs is None:
+            no_answer_probs = {k: 0.0 for k in preds}
+        rows = []
+        for i, qas_id in enumerate(qas_ids):
+            if qas_id in preds: rows.append(i)
+            else: print("Missing prediction for %s" % qas_id)
+        row_of = {qas_ids[i]: row for row, i in enumerate(rows)}
+        evaluations.append(_evaluate_arrays(
+            np.array([_score_prediction(golds[i], preds[qas_ids[i]]) for i in rows], dtype=np.float64).reshape(-1, 2),
+            has_answer[rows],
+            np.array([bool(preds[qas_ids[i]]) for i in rows], dtype=bool),
+            np.array([no_answer_probs[qas_ids[i]] for i in rows], dtype=np.float64),
+            np.array([row_of[qas_id] for qas_id in no_answer_probs if qas_id in row_of], dtype=np.int64),
+            num_no_ans,
+            no_answer_probability_threshold,
+            find_thresholds=bool(no_answer_probs),
+        ))
+    return evaluations
 
 # Cell
 def get_final_text(pred_text, orig_text, do_lower_case, verbose_logging=False):
@@ -435,15 +464,50 @@ def get_final_text(pred_text, orig_text, do_lower_case, verbose_logging=False):
 
 # Internal Cell
 def _get_best_indexes(logits, n_best_size):
-    """Get the n-best logits from a list."""
-    index_and_score = sorted(enumerate(logits), key=lambda x: x[1], reverse=True)
+    """Get the n-best logits from a list, or from each row of an array."""
+    return np.argsort(-np.asarray(logits), axis=-1, kind="stable")[..., :n_best_size]
+
+# Internal Cell
+_BatchLogits = collections.namedtuple("BatchLogits", ["unique_ids", "start_logits", "end_logits"])
+
+# Internal Cell
+def _stack_results(all_results):
+    """Stack the unique ids, start logits and end logits of a list of `SquadResult`s into a `_BatchLogits`
+    of arrays with one row per feature."""
+    unique_ids = np.array([result.unique_id for result in all_results])
+    if not len(unique_ids):
+        return _BatchLogits(unique_ids, np.zeros((0, 0), dtype=np.float32), np.zeros((0, 0), dtype=np.float32))
+    start_logits = np.stack([result.start_logits for result in all_results])
+    end_logits = np.stack([result.end_logits for result in all_results])
+    return _BatchLogits(unique_ids, start_logits, end_logits)
 
-    best_indexes = []
-    for i in range(len(index_and_score)):
-        if i >= n_best_size:
-            break
-        best_indexes.append(index_and_score[i][0])
-    return best_indexes
+# Internal Cell
+def _score_spans(features, start_logits, end_logits, n_best_size, max_answer_length):
+    """Score every pair of the n-best start and end indexes of every feature of an example at once.
+
+    `start_logits` and `end_logits` hold one row per feature. Spans outside the context, ending before they
+    start, longer than `max_answer_length` or starting outside their max context are masked out. Returns the
+    feature index, start index, end index, start logit and end logit of every remaining span, in the order
+    the original nested loops produced them."""
+    n_features, n_tokens = start_logits.shape
+    start_indexes = _get_best_indexes(start_logits, n_best_size)[:, :, None]
+    end_indexes = _get_best_indexes(end_logits, n_best_size)[:, None, :]
+
+    in_context = np.zeros((n_features, n_tokens), dtype=bool)
+    max_context = np.zeros((n_features, n_tokens), dtype=bool)
+    for (feature_index, feature) in enumerate(features):
+        in_context[feature_index, [i for i in feature.token_to_orig_map if i < len(feature.tokens)]] = True
+        max_context[feature_index, [i for i, is_max in feature.token_is_max_context.items() if is_max]] = True
+
+    rows = np.arange(n_features)[:, None, None]
+    valid = (
+        in_context[rows, start_indexes] & max_context[rows, start_indexes] & in_context[rows, end_indexes]
+        & (end_indexes >= start_indexes) & (end_indexes - start_indexes + 1 <= max_answer_length)
+    )
+    feature_indexes, start_ranks, end_ranks = np.nonzero(valid)
+    starts = start_indexes[feature_indexes, start_ranks, 0]
+    ends = end_indexes[feature_indexes, 0, end_ranks]
+    return feature_indexes, starts, ends, start_logits[feature_indexes, starts], end_logits[feature_indexes, ends]
 
 # Internal Cell
 def _compute_softmax(scores):
@@ -468,11 +532,11 @@ def _compute_softmax(scores):
         probs.append(score / total_sum)
     return probs
 
-# Cell
-def compute_predictions_logits(
+# Internal Cell
+def _compute_predictions_from_logits(
     all_examples,
     all_features,
-    all_results,
+    batch_logits,
     n_best_size,
     max_answer_length,
     do_lower_case,
@@ -484,14 +548,16 @@ def compute_predictions_logits(
     output_nbest_file=None,
     output_null_log_odds_file=None,
 ):
+    """`compute_predictions_logits`, reading the logits of every feature from the arrays of `batch_logits`."""
 
     example_index_to_features = collections.defaultdict(list)
     for feature in all_features:
         example_index_to_features[feature.example_index].append(feature)
 
-    unique_id_to_result = {}
-    for result in all_results:
-        unique_id_to_result[result.unique_id] = result
+    # Logits are read straight from arrays holding every feature
+    unique_ids, all_start_logits, all_end_logits = batch_logits
+    unique_ids = np.asarray(unique_ids)
+    unique_id_to_row = {unique_id: row for row, unique_id in enumerate(unique_ids.tolist())}
 
     _PrelimPrediction = collections.namedtuple(  # pylint: disable=invalid-name
         "PrelimPrediction",
@@ -505,68 +571,43 @@ def compute_predictions_logits(
     for (example_index, example) in enumerate(all_examples):
         features = example_index_to_features[example_index]
 
-        prelim_predictions = []
+        rows = [unique_id_to_row[feature.unique_id] for feature in features]
+        feature_start_logits, feature_end_logits = all_start_logits[rows], all_end_logits[rows]
+        feature_indexes, start_indexes, end_indexes, start_logits, end_logits = _score_spans(
+            features, feature_start_logits, feature_end_logits, n_best_size, max_answer_length
+        )
         # keep track of the minimum score of null start+end of position 0
         score_null = 1000000  # large and positive
         min_null_feature_index = 0  # the paragraph slice with min null score
         null_start_logit = 0  # the start logit at the slice with min null score
         null_end_logit = 0  # the end logit at the slice with min null score
-        for (feature_index, feature) in enumerate(features):
-            result = unique_id_to_result[feature.unique_id]
-            start_indexes = _get_best_indexes(result.start_logits, n_best_size)
-            end_indexes = _get_best_indexes(result.end_logits, n_best_size)
-            # if we could have irrelevant answers, get the min score of irrelevant
-            if version_2_with_negative:
-                feature_null_score = result.start_logits[0] + result.end_logits[0]
-                if feature_null_score < score_null:
-                    score_null = feature_null_score
-                    min_null_feature_index = feature_index
-                    null_start_logit = result.start_logits[0]
-                    null_end_logit = result.end_logits[0]
-            for start_index in start_indexes:
-                for end_index in end_indexes:
-                    # We could hypothetically create invalid predictions, e.g., predict
-                    # that the start of the span is in the question. We throw out all
-                    # invalid predictions.
-                    if start_index >= len(feature.tokens):
-                        continue
-                    if end_index >= len(feature.tokens):
-                        continue
-                    if start_index not in feature.token_to_orig_map:
-                        continue
-                    if end_index not in feature.token_to_orig_map:
-                        continue
-                    if not feature.token_is_max_context.get(start_index, False):
-                        continue
-                    if end_index < start_index:
-                        continue
-                    length = end_index - start_index + 1
-                    if length > max_answer_length:
-                        continue
-                    prelim_predictions.append(
-                        _PrelimPrediction(
-                            feature_index=feature_index,
-                            start_index=start_index,
-                            end_index=end_index,
-                            start_logit=result.start_logits[start_index],
-                            end_logit=result.end_logits[end_index],
-                        )
-                    )
+        # if we could have irrelevant answers, get the min score of irrelevant
         if version_2_with_negative:
-            prelim_predictions.append(
-                _PrelimPrediction(
-                    feature_index=min_null_feature_index,
-                    start_index=0,
-                    end_index=0,
-                    start_logit=null_start_logit,
-                    end_logit=null_end_logit,
-                )
+            if len(features):
+                feature_null_scores = feature_start_logits[:, 0].astype(np.float64) + feature_end_logits[:, 0]
+                feature_index = int(feature_null_scores.argmin())
+                if feature_null_scores[feature_index] < score_null:
+                    score_null = feature_null_scores[feature_index].item()
+                    min_null_feature_index = feature_index
+                    null_start_logit = feature_start_logits[feature_index, 0].item()
+                    null_end_logit = feature_end_logits[feature_index, 0].item()
+            feature_indexes = np.append(feature_indexes, min_null_feature_index)
+            start_indexes, end_indexes = np.append(start_indexes, 0), np.append(end_indexes, 0)
+            start_logits = np.append(start_logits, np.asarray(null_start_logit, dtype=start_logits.dtype))
+            end_logits = np.append(end_logits, np.asarray(null_end_logit, dtype=end_logits.dtype))
+
+        order = np.argsort(-(start_logits.astype(np.float64) + end_logits), kind="stable")
+        prelim_predictions = [
+            _PrelimPrediction(*o)
+            for o in zip(
+                feature_indexes[order].tolist(),
+                start_indexes[order].tolist(),
+                end_indexes[order].tolist(),
+                # Plain floats, so the n-best answers stay JSON serializable
+                start_logits[order].tolist(),
+                end_logits[order].tolist(),
             )
-        prelim_predictions = sorted(
-            prelim_predictions,
-            key=lambda x: (x.start_logit + x.end_logit),
-            reverse=True,
-        )
+        ]
 
         _NbestPrediction = collections.namedtuple(  # pylint: disable=invalid-name
             "NbestPrediction",
@@ -608,6 +649,7 @@ def compute_predictions_logits(
             else:
                 final_text = ""
                 seen_predictions[final_text] = True
+                orig_doc_start, orig_doc_end = 0, 0
 
             nbest.append(
                 _NbestPrediction(
@@ -713,6 +755,38 @@ def compute_predictions_logits(
 
     return all_predictions, all_nbest_json
 
+# Cell
+def compute_predictions_logits(
+    all_examples,
+    all_features,
+    all_results,
+    n_best_size,
+    max_answer_length,
+    do_lower_case,
+    verbose_logging,
+    version_2_with_negative,
+    null_score_diff_threshold,
+    tokenizer,
+    output_prediction_file=None,
+    output_nbest_file=None,
+    output_null_log_odds_file=None,
+):
+    return _compute_predictions_from_logits(
+        all_examples,
+        all_features,
+        _stack_results(all_results),
+        n_best_size,
+        max_answer_length,
+        do_lower_case,
+        verbose_logging,
+        version_2_with_negative,
+        null_score_diff_threshold,
+        tokenizer,
+        output_prediction_file,
+        output_nbest_file,
+        output_null_log_odds_file,
+    )
+
 # Cell
 def compute_predictions_log_probs(
     all_examples,
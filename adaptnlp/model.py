@@ -3,6 +3,7 @@
 __all__ = ['CudaCallback', 'AdaptiveModel']
 
 # Cell
+import threading
 from typing import Union, List
 from pathlib import Path
 from abc import ABC, abstractmethod
@@ -22,7 +23,7 @@ from fastai.callback.progress import ProgressCallback
 from fastai.learner import Learner
 from fastai.data.core import DataLoaders
 
-from fastai.torch_core import to_device, default_device
+from fastai.torch_core import to_device, to_detach, default_device
 
 from .callback import GatherInputsCallback, SetInputsCallback
 
@@ -51,7 +52,7 @@ class CudaCallback(Callback):
         self,
         device:str=None # A device to move the data to, such as 'cuda:0' or 'cpu'
     ): self.device = ifnone(device, default_device())
-    def before_batch(self): self.learn.xb,self.learn.yb = to_device(self.xb),to_device(self.yb)
+    def before_batch(self): self.learn.xb,self.learn.yb = to_device(self.xb, self.device),to_device(self.yb, self.device)
     def before_fit(self): self.model.to(self.device)
 
 # Internal Cell
@@ -66,25 +67,32 @@ class _NoopModel(nn.Module):
 
     def forward(self, x): return x*self.a + self.b
 
+# Internal Cell
+# `torch.inference_mode` was added in torch 1.9
+_inference_mode = getattr(torch, 'inference_mode', torch.no_grad)
+
 # Internal Cell
 class _BaseLearner:
     """
     Simple `Learner` class with `synth` DataLoaders, a noop model, and a noop loss function.
 
+    Each `AdaptiveModel` owns its own `_BaseLearner`, so callbacks, device, and model are never
+    shared between two models living in the same process.
+
     Contains access to minimal `Learner` functionality including:
       - `get_preds`
       - `lr_find`, `fit_one_cycle`, `fit_flat_cos`, `fit_sgdr`, `fit` (not implemented)
       - `metrics`, `opt_func`, `splitter`, `wd`, `moms` (not implemented)
     """
-    __cbs = [SetInputsCallback(), GatherInputsCallback()]
-
     def __init__(self, device='cuda' if torch.cuda.is_available() else 'cpu') -> None:
         """
         Generates blank `Learner` and stores it away privately.
         """
-        self.__cbs.append(CudaCallback(device))
+        self.__cbs = [SetInputsCallback(), GatherInputsCallback(), CudaCallback(device)]
         self.__learner = Learner(self._generate_dls(), _NoopModel(), loss_func=noop, cbs=self.__cbs)
         self.__default_dls, self.__default_model = True, True
+        # A `Learner` holds per-call state (`xb`, `pred`, `dl`), so one engine runs one batch loop at a time
+        self.__lock = threading.Lock()
 
     def _generate_dls(self, a=2, b=3, batch_size=16, n_train=10, n_valid=2) -> DataLoaders:
         """
@@ -113,12 +121,39 @@ class _BaseLearner:
         if dl is None: raise ValueError("`dl` should not be `None`")
         if isinstance(self.__learner.model, _NoopModel):
             raise ValueError("The default model is still set, you should override this with `_BaseLearner.set_model(x)`")
-        return self.__learner.get_preds(dl=dl, cbs=cbs)
+        with self.__lock:
+            return self.__learner.get_preds(dl=dl, cbs=cbs)
+
+    def fast_preds(self, dl=None):
+        """
+        Get raw predictions based on `dl` with a plain forward pass.
+
+        Produces the same outputs as `get_preds` with no extra `cbs`, but skips all `Callback` dispatch
+        """
+        if dl is None: raise ValueError("`dl` should not be `None`")
+        model = self.__learner.model
+        if isinstance(model, _NoopModel):
+            raise ValueError("The default model is still set, you should override this with `_BaseLearner.set_model(x)`")
+        model.to(self.device)
+        model.eval()
+        preds = []
+        with _inference_mode():
+            for batch in dl:
+                batch = to_device(batch, self.device)
+                inputs = {'input_ids':batch[0], 'attention_mask':batch[1]}
+                if len(batch) > 2: inputs['token_type_ids'] = batch[2]
+                preds.append(to_detach(model(**inputs)))
+        return preds, None
+
+    @property
+    def device(self):
+        "The device the `CudaCallback` moves the model and batches to"
+        return self.__cbs[-1].device
 
     def set_device(self, device:str='cpu'):
-        if device != 'cpu' and device != 'cuda':
+        if not str(device).startswith(('cpu', 'cuda')):
             raise ValueError("Device must either be `cpu` or `cuda`")
-        self.__learn.__cbs[-1].device = device
+        self.__cbs[-1].device = device
 
     def set_as_dict(self, as_dict:bool=False):
         """
@@ -135,9 +170,65 @@ class _BaseLearner:
         """
         self.__learner.model = model
 
+# Internal Cell
+def _bucketed_dataloader(
+    tokenizer, # A tokenizer object from Huggingface's transformers
+    encodings:dict, # Un-padded encodings, such as the result of `tokenizer(texts)`
+    batch_size:int, # A batch size
+    keys:tuple=('input_ids', 'attention_mask') # The keys of `encodings` to return in each batch, in order
+) -> (DataLoader, List[int]):
+    """
+    Builds a `DataLoader` over `encodings` sorted from longest to shortest, where each batch is only padded to
+    its own longest sequence. Also returns the original index of every item in the order they are yielded
+    """
+    order = sorted(range(len(encodings['input_ids'])), key=lambda k: len(encodings['input_ids'][k]), reverse=True)
+    def _collate(idxs):
+        batch = tokenizer.pad({k:[encodings[k][i] for i in idxs] for k in keys}, return_tensors='pt')
+        return tuple(batch[k] for k in keys)
+    return DataLoader(order, batch_size=batch_size, collate_fn=_collate), order
+
+# Internal Cell
+def _windowed_encodings(
+    tokenizer, # A tokenizer object from Huggingface's transformers
+    input_ids:List[List[int]], # The token ids of each text, without special tokens
+    window_size:int, # Maximum number of tokens in a window, including special tokens
+    stride:int # Number of tokens consecutive windows of a text overlap by
+) -> dict:
+    """
+    Splits every text in `input_ids` into overlapping windows of at most `window_size` tokens, similar to `doc_stride` in
+    question answering. Besides the model inputs, `overflow_to_sample_mapping` holds the text each window came from and
+    `token_positions` the position in its text of every token in the window, or -1 for special tokens
+    """
+    n_tokens = window_size - tokenizer.num_special_tokens_to_add()
+    if not 0 <= stride < n_tokens:
+        raise ValueError(f'`stride` must be between 0 and {n_tokens-1} with a `window_size` of {window_size}')
+    # Where a sequence starts once special tokens are added to it
+    n_prefix = tokenizer.build_inputs_with_special_tokens([-1]).index(-1)
+    enc = {k:[] for k in ('input_ids', 'attention_mask', 'token_type_ids', 'overflow_to_sample_mapping', 'token_positions')}
+    for i, ids in enumerate(input_ids):
+        start = 0
+        while True:
+            window = ids[start:start+n_tokens]
+            window_ids = tokenizer.build_inputs_with_special_tokens(window)
+            positions = [-1] * len(window_ids)
+            positions[n_prefix:n_prefix+len(window)] = range(start, start+len(window))
+            enc['input_ids'].append(window_ids)
+            enc['attention_mask'].append([1] * len(window_ids))
+            enc['token_type_ids'].append(tokenizer.create_token_type_ids_from_sequences(window))
+            enc['overflow_to_sample_mapping'].append(i)
+            enc['token_positions'].append(positions)
+            if start + n_tokens >= len(ids): break
+            start += n_tokens - stride
+    return enc
+
 # Cell
 class AdaptiveModel(ABC):
-    _learn = _BaseLearner()
+    @property
+    def _learn(self) -> _BaseLearner:
+        "The inference engine owned by this model, created on first use"
+        if '_engine' not in self.__dict__: self._engine = _BaseLearner()
+        return self._engine
+
     def set_model(
         self,
         model # A PyTorch model
@@ -164,15 +255,32 @@ class AdaptiveModel(ABC):
     def get_preds(
         self,
         dl=None, # An iterable DataLoader or DataLoader-like object
-        cbs=[] # Optional fastai `Callbacks`
+        cbs=[], # Optional fastai `Callbacks`
+        fast_path:bool=True # Whether to skip the fastai `Learner` and run a plain forward pass when no `cbs` are passed
     ):
         """
         Get raw predictions based on `dl` with `cbs`.
 
         For basic inference, `cbs` should include any `Callbacks` needed to do general inference
         """
+        if fast_path and not cbs: return self._learn.fast_preds(dl=dl)
         return self._learn.get_preds(dl=dl, cbs=cbs)
 
+    def __getstate__(self):
+        "The inference engine holds a lock and is not pickled, only the device it runs on"
+        state = self.__dict__.copy()
+        engine = state.pop('_engine', None)
+        if engine is not None: state['_engine_device'] = engine.device
+        return state
+
+    def __setstate__(self, state):
+        "Rebuilds the inference engine of a pickled model"
+        device = state.pop('_engine_device', None)
+        self.__dict__.update(state)
+        if device is not None:
+            if 'model' in state: self._learn.set_model(self.model)
+            self._learn.set_device(device)
+
     @abstractmethod
     def load(
         self,
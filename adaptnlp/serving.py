@@ -0,0 +1,468 @@
+# AUTOGENERATED! DO NOT EDIT! File to edit: nbs/17_serving.ipynb (unless otherwise specified).
+
+__all__ = ['MicroBatcher', 'ModelRegistry', 'InferenceWorkerPool', 'FAST_MEDIA_TYPES', 'NDJSON_MEDIA_TYPE',
+           'negotiate_media_type', 'encode_response', 'respond', 'iter_mini_batches', 'ndjson_lines', 'respond_batch']
+
+# Cell
+import asyncio
+import importlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import torch
+from torch import nn
+import torch.multiprocessing
+
+from fastcore.basics import ifnone
+
+# Cell
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches, running `predict_batch` once per batch in `executor`
+
+    Each call to `submit` queues one item and waits for its result. A single worker task gathers queued items
+    until `max_batch_size` are waiting or the oldest one has waited `max_wait_ms`, then runs them together,
+    so the event loop keeps accepting requests while the model is busy
+    """
+    def __init__(
+        self,
+        predict_batch:Callable, # A function taking a list of items and keyword arguments, returning one result per item
+        max_batch_size:int=32, # The most items passed to one call of `predict_batch`
+        max_wait_ms:float=5, # How long the oldest queued item waits for more items before its batch is run
+        executor:Executor=None, # Where `predict_batch` is run, a thread for each batch in flight by default
+        max_in_flight:int=1, # The most batches run at once, such as the number of workers of an `InferenceWorkerPool`
+    ):
+        if max_batch_size < 1: raise ValueError('`max_batch_size` must be at least 1')
+        if max_in_flight < 1: raise ValueError('`max_in_flight` must be at least 1')
+        self.predict_batch, self.max_batch_size, self.max_wait = predict_batch, max_batch_size, max_wait_ms / 1000
+        self.max_in_flight = max_in_flight
+        self._own_executor = executor is None
+        self.executor = ifnone(executor, ThreadPoolExecutor(max_workers=max_in_flight))
+        # `(arrival time, item, kwargs, future)` of every item waiting to be run, oldest first
+        self._pending = []
+        self._is_full, self._slots, self._worker = None, None, None
+        self.n_batches, self.n_items = 0, 0
+
+    async def submit(
+        self,
+        item:Any, # A single input to `predict_batch`, such as one text
+        **kwargs, # Keyword arguments for `predict_batch`, only items with equal `kwargs` share a batch
+    ) -> Any: # The result of `predict_batch` for `item`
+        "Queues `item` for the next batch and waits for its result"
+        loop = asyncio.get_event_loop()
+        # Created here rather than in `__init__`, as asyncio primitives are bound to the loop they were made in
+        if self._is_full is None: self._is_full, self._slots = asyncio.Event(), asyncio.Semaphore(self.max_in_flight)
+        future = loop.create_future()
+        self._pending.append((loop.time(), item, kwargs, future))
+        if len(self._pending) >= self.max_batch_size: self._is_full.set()
+        if self._worker is None: self._worker = asyncio.ensure_future(self._run())
+        return await future
+
+    async def submit_many(
+        self,
+        items:List[Any], # Inputs to `predict_batch`, such as the texts of one request
+        **kwargs, # Keyword arguments for `predict_batch`
+    ) -> List[Any]: # The result of `predict_batch` for each item
+        "Queues every item in `items` and waits for all of their results"
+        return list(await asyncio.gather(*[self.submit(item, **kwargs) for item in items]))
+
+    async def _run(self):
+        "Runs batches until no items are left waiting"
+        loop = asyncio.get_event_loop()
+        try:
+            while self._pending:
+                # Items keep queueing while every batch slot is busy
+                await self._slots.acquire()
+                deadline = self._pending[0][0] + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0: break
+                    self._is_full.clear()
+                    try: await asyncio.wait_for(self._is_full.wait(), timeout)
+                    except asyncio.TimeoutError: break
+                batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+                asyncio.ensure_future(self._run_batch(batch)).add_done_callback(lambda _: self._slots.release())
+        finally:
+            self._worker = None
+
+    async def _run_batch(self, batch:list):
+        "Runs `predict_batch` once for each group of items in `batch` sharing their `kwargs`, and resolves their futures"
+        groups = {}
+        for _, item, kwargs, future in batch:
+            # Requests whose client has gone away are cancelled, and not worth running
+            if future.done(): continue
+            groups.setdefault(repr(sorted(kwargs.items())), []).append((item, kwargs, future))
+        for group in groups.values():
+            await self._run_group([(item, future) for item, _, future in group], group[0][1])
+
+    async def _run_group(self, group:list, kwargs:dict):
+        """Runs `predict_batch` on the `(item, future)` pairs of `group` and resolves their futures
+
+        A failed group is split in two and each half run again, so that only the items that fail on their own
+        get the exception rather than every request that shared their batch"""
+        group = [(item, future) for item, future in group if not future.done()]
+        if not group: return
+        items = [item for item, _ in group]
+        try:
+            results = await asyncio.get_event_loop().run_in_executor(
+                self.executor, partial(self.predict_batch, items, **kwargs)
+            )
+            if len(results) != len(items):
+                raise ValueError(f'`predict_batch` returned {len(results)} results for a batch of {len(items)} items')
+        except Exception as e:
+            if len(group) > 1:
+                half = len(group) // 2
+                await self._run_group(group[:half], kwargs)
+                await self._run_group(group[half:], kwargs)
+                return
+            _, future = group[0]
+            if not future.done(): future.set_exception(e)
+            return
+        self.n_batches += 1
+        self.n_items += len(items)
+        for (_, future), result in zip(group, results):
+            if not future.done(): future.set_result(result)
+
+    def close(self):
+        "Cancels every queued item and shuts down the executor if it was made by this `MicroBatcher`"
+        if self._worker is not None: self._worker.cancel()
+        for *_, future in self._pending:
+            if not future.done(): future.cancel()
+        self._pending = []
+        if self._own_executor: self.executor.shutdown(wait=False)
+
+# Internal Cell
+def _torch_modules(obj, depth:int=3, seen:set=None) -> List[nn.Module]:
+    "Every `nn.Module` in `obj`, found through attributes, dicts, lists and tuples up to `depth` levels deep"
+    seen = ifnone(seen, set())
+    if id(obj) in seen: return []
+    seen.add(id(obj))
+    if isinstance(obj, nn.Module): return [obj]
+    if depth == 0: return []
+    if isinstance(obj, dict): children = obj.values()
+    elif isinstance(obj, (list, tuple)): children = obj
+    elif hasattr(obj, '__dict__'): children = vars(obj).values()
+    else: return []
+    return [m for child in children for m in _torch_modules(child, depth - 1, seen)]
+
+def _model_bytes(model) -> int:
+    "Number of bytes held by the parameters and buffers of every `nn.Module` in `model`, such as an `AdaptiveModel`"
+    tensors = {id(t):t for m in _torch_modules(model) for t in (*m.parameters(), *m.buffers())}
+    return sum(t.numel() * t.element_size() for t in tensors.values())
+
+# Cell
+class ModelRegistry:
+    """
+    A shared registry of loaded models for serving several tasks and models from one process
+
+    Models are loaded the first time they are asked for with the loader of their task. Once the models held take up more
+    than `max_memory_mb`, or there are more than `max_models` of them, the least recently used ones are dropped
+    """
+    def __init__(
+        self,
+        loaders:Dict[str, Callable], # A function for each task name that loads a model from its name, such as `TransformersSummarizer.load`
+        max_memory_mb:float=None, # Approximate cap on the memory of the parameters and buffers of every model held
+        max_models:int=None, # Cap on the number of models held
+    ):
+        self.loaders = loaders
+        self.max_memory = None if max_memory_mb is None else int(max_memory_mb * 2**20)
+        self.max_models = max_models
+        # `(task, name)` -> `(model, size)` of every model held, least recently used first
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per model being loaded, so a model is never loaded twice at once
+        self._loading = {}
+        self.size, self.n_loads, self.n_evictions = 0, 0, 0
+
+    def get(
+        self,
+        task:str, # The task the model is for, a key of `loaders`
+        name:str, # The name or path of the model to pass to the task's loader
+    ) -> Any: # The loaded model
+        "Returns the model `name` for `task`, loading it first if it isn't held, and marks it as the most recently used"
+        if task not in self.loaders: raise KeyError(f'No loader for the task {task!r}')
+        key = (task, name)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0]
+            loading = self._loading.setdefault(key, threading.Lock())
+        with loading:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key][0]
+            try:
+                model = self.loaders[task](name)
+                size = _model_bytes(model)
+                with self._lock:
+                    self._models[key] = (model, size)
+                    self.size += size
+                    self.n_loads += 1
+                    self._evict()
+            finally:
+                with self._lock: self._loading.pop(key, None)
+        return model
+
+    def _evict(self):
+        "Drops the least recently used models until the caps are met, always keeping the newest one"
+        evicted = False
+        while len(self._models) > 1 and (
+            (self.max_memory is not None and self.size > self.max_memory) or
+            (self.max_models is not None and len(self._models) > self.max_models)
+        ):
+            _, (_, size) = self._models.popitem(last=False)
+            self.size -= size
+            self.n_evictions += 1
+            evicted = True
+        if evicted and torch.cuda.is_available(): torch.cuda.empty_cache()
+
+    def evict(
+        self,
+        task:str, # The task the model is for
+        name:str, # The name or path of the model
+    ):
+        "Drops the model `name` for `task` if it is held"
+        with self._lock:
+            if (task, name) not in self._models: return
+            self.size -= self._models.pop((task, name))[1]
+            self.n_evictions += 1
+
+    def loaded(self) -> List[dict]:
+        "The task, name and approximate size in megabytes of every model held, least recently used first"
+        with self._lock:
+            return [{'task':task, 'name':name, 'size_mb':size / 2**20} for (task, name), (_, size) in self._models.items()]
+
+    def __contains__(self, key:tuple): return key in self._models
+    def __len__(self): return len(self._models)
+
+    def __repr__(self):
+        max_size = 'unlimited' if self.max_memory is None else f'{self.max_memory/2**20:.1f}MB'
+        return f'{self.__class__.__name__}(models={len(self)}, size={self.size/2**20:.1f}MB/{max_size}, loads={self.n_loads}, evictions={self.n_evictions})'
+
+# Internal Cell
+# The model of an `InferenceWorkerPool` worker process
+_worker_model = None
+
+def _init_worker(model, num_threads:int):
+    "Sets up an `InferenceWorkerPool` worker process"
+    global _worker_model
+    torch.set_num_threads(num_threads)
+    _worker_model = model
+
+def _run_in_worker(method:str, args:tuple, kwargs:dict):
+    "Calls `method` of the model of this worker process, without tracking gradients"
+    with torch.no_grad(): return getattr(_worker_model, method)(*args, **kwargs)
+
+# Cell
+class InferenceWorkerPool:
+    """
+    Runs the methods of a model in a pool of worker processes that share its weights, for CPU inference
+
+    The weights are moved into shared memory once, and every worker maps the same memory rather than holding its
+    own copy. Workers are started with `start_method`, "spawn" by default, since a forked worker can hang in its
+    first multi-threaded operation once the parent process has run one
+    """
+    def __init__(
+        self,
+        model, # A loaded model to share, such as an `AdaptiveModel` or an `Easy` module that has loaded its models
+        n_workers:int=2, # Number of worker processes
+        num_threads:int=None, # Number of threads each worker runs PyTorch operations with, the CPUs split between workers by default
+        start_method:str='spawn', # How worker processes are started, see `multiprocessing.get_context`
+    ):
+        if n_workers < 1: raise ValueError('`n_workers` must be at least 1')
+        self.n_workers = n_workers
+        self.num_threads = ifnone(num_threads, max(1, (os.cpu_count() or 1) // n_workers))
+        for module in _torch_modules(model): module.share_memory()
+        # `torch.multiprocessing` pickles tensors in shared memory as handles to it, rather than copying them
+        ctx = torch.multiprocessing.get_context(start_method)
+        self._pool = ctx.Pool(n_workers, initializer=_init_worker, initargs=(model, self.num_threads))
+
+    def run(
+        self,
+        method:str, # The name of the model's method to call, such as "predict"
+        *args, # Positional arguments for `method`
+        **kwargs, # Keyword arguments for `method`
+    ) -> Any: # The result of `method`
+        "Calls `method` of the model in the next free worker, and waits for its result"
+        return self._pool.apply(_run_in_worker, (method, args, kwargs))
+
+    def close(self):
+        "Stops every worker process"
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.close()
+
+# Internal Cell
+@lru_cache(maxsize=None)
+def _optional_import(name:str):
+    "Imports the module `name`, or returns `None` when it isn't installed"
+    try: return importlib.import_module(name)
+    except ImportError: return None
+
+def _to_builtin(o):
+    "Converts values `json` and `msgpack` can't encode, such as NumPy or PyTorch scores, to Python numbers and lists"
+    if hasattr(o, 'tolist'): return o.tolist()
+    raise TypeError(f'Object of type {type(o).__name__} is not serializable')
+
+def _encode_json(payload) -> bytes:
+    "Encodes `payload` as JSON, with `orjson` when it is installed"
+    orjson = _optional_import('orjson')
+    if orjson is not None: return orjson.dumps(payload, default=_to_builtin, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_to_builtin, separators=(',', ':')).encode()
+
+def _encode_msgpack(payload) -> bytes:
+    "Encodes `payload` as MessagePack"
+    return _optional_import('msgpack').packb(payload, default=_to_builtin, use_bin_type=True)
+
+def _encode_arrow(payload) -> bytes:
+    "Encodes `payload`, a list of records or a dict of columns, as an Arrow IPC stream holding one table"
+    pa = _optional_import('pyarrow')
+    if isinstance(payload, list) and all(isinstance(row, dict) for row in payload):
+        # Built from columns rather than with `Table.from_pylist`, which older versions of pyarrow don't have
+        keys = list(OrderedDict.fromkeys(k for row in payload for k in row))
+        payload = {k:[row.get(k) for row in payload] for k in keys}
+    if not isinstance(payload, dict): raise ValueError('Only a list of records or a dict of columns can be encoded as an Arrow table')
+    table = pa.Table.from_pydict(payload)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer: writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+# `(module needed, encoder)` of every fast response format, by its media type
+_ENCODERS = {
+    'application/vnd.adaptnlp+json': ('json', _encode_json),
+    'application/msgpack': ('msgpack', _encode_msgpack),
+    'application/x-msgpack': ('msgpack', _encode_msgpack),
+    'application/vnd.apache.arrow.stream': ('pyarrow', _encode_arrow),
+}
+
+# Cell
+# The media types of the fast response formats, each sent only when the module encoding it is installed
+FAST_MEDIA_TYPES = list(_ENCODERS)
+
+# The media type of a response streamed as newline delimited JSON, one line per result
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+# Cell
+def negotiate_media_type(
+    accept:str=None, # The `Accept` header of a request, such as "application/msgpack, application/json;q=0.5"
+    offered:list=None, # The media types the response can be sent as besides JSON, `FAST_MEDIA_TYPES` by default
+) -> Optional[str]: # One of `offered`, or `None` for the usual validated JSON
+    """
+    The response format `accept` prefers, out of the `offered` ones whose module is installed
+
+    Media types are tried from the highest quality value down, and in the order they are listed on ties.
+    `None` is returned when JSON or any type comes first, or when none of the `offered` formats can be sent
+    """
+    if not accept: return None
+    offered = ifnone(offered, FAST_MEDIA_TYPES)
+    ranked = []
+    for i, part in enumerate(accept.split(',')):
+        media_type, *params = [p.strip() for p in part.split(';')]
+        q = 1.
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip() == 'q':
+                try: q = float(value)
+                except ValueError: q = 0.
+        if q > 0: ranked.append((-q, i, media_type.lower()))
+    for _, _, media_type in sorted(ranked):
+        if media_type in offered:
+            module = _ENCODERS[media_type][0] if media_type in _ENCODERS else 'json'
+            if module == 'json' or _optional_import(module) is not None: return media_type
+        elif media_type in ('application/json', 'application/*', '*/*'): return None
+    return None
+
+# Cell
+def encode_response(
+    payload:Any, # A response built from dicts, lists, strings and numbers, such as the result of `Sentence.to_dict`
+    media_type:str, # One of `FAST_MEDIA_TYPES`, such as the result of `negotiate_media_type`
+) -> bytes: # The encoded response body
+    "Encodes `payload` in the fast response format `media_type`, skipping any validation against a response model"
+    if media_type not in _ENCODERS: raise ValueError(f'{media_type} is not one of {FAST_MEDIA_TYPES}')
+    return _ENCODERS[media_type][1](payload)
+
+# Internal Cell
+def _fastapi_responses():
+    "The `fastapi.responses` module, needed to send anything but the validated JSON of an endpoint"
+    responses = _optional_import('fastapi.responses')
+    if responses is None: raise ImportError('`fastapi` must be installed to send a response in a fast format')
+    return responses
+
+# Cell
+def respond(
+    payload:Any, # A response built from dicts, lists, strings and numbers, such as the result of `Sentence.to_dict`
+    accept:str=None, # The `Accept` header of the request
+): # `payload` itself, or a `fastapi.Response` of it
+    """
+    Returns `payload` for an endpoint to validate against its response model and send as JSON, or a response
+    of it encoded in the fast format `accept` asks for
+    """
+    media_type = negotiate_media_type(accept)
+    if media_type is None: return payload
+    return _fastapi_responses().Response(content=encode_response(payload, media_type), media_type=media_type)
+
+# Cell
+async def iter_mini_batches(
+    predict_batch:Callable, # A function taking a list of items and keyword arguments, returning one result per item
+    items:list, # Every input of a batch request
+    mini_batch_size:int=32, # The most items passed to one call of `predict_batch`
+    executor:Executor=None, # Where `predict_batch` is run, the event loop's default executor by default
+    **kwargs, # Keyword arguments for `predict_batch`
+) -> AsyncIterator[Any]: # The result of every item, in order
+    """
+    Runs `predict_batch` on `items` one mini-batch at a time in `executor`, yielding each result once its mini-batch is done
+
+    The next mini-batch is started before the results of the last one are yielded, so the model is kept busy
+    while they are sent
+    """
+    if mini_batch_size < 1: raise ValueError('`mini_batch_size` must be at least 1')
+    loop = asyncio.get_event_loop()
+    def _start(i): return loop.run_in_executor(executor, partial(predict_batch, items[i:i+mini_batch_size], **kwargs))
+    starts = range(0, len(items), mini_batch_size)
+    running = _start(0) if items else None
+    for start in starts:
+        results = await running
+        if start + mini_batch_size < len(items): running = _start(start + mini_batch_size)
+        n_items = min(mini_batch_size, len(items) - start)
+        if len(results) != n_items:
+            raise ValueError(f'`predict_batch` returned {len(results)} results for a batch of {n_items} items')
+        for result in results: yield result
+
+# Cell
+async def ndjson_lines(
+    results:AsyncIterator[Any], # Results built from dicts, lists, strings and numbers, such as from `iter_mini_batches`
+) -> AsyncIterator[bytes]: # One line of JSON per result
+    "Encodes every result of `results` as one line of JSON as it arrives, for a response streamed as `NDJSON_MEDIA_TYPE`"
+    async for result in results: yield _encode_json(result) + b'\n'
+
+# Cell
+async def respond_batch(
+    predict_batch:Callable, # A function taking a list of items, `mini_batch_size` and keyword arguments, returning one result per item
+    items:list, # Every input of a batch request
+    mini_batch_size:int=32, # The most items the model runs at once
+    accept:str=None, # The `Accept` header of the request
+    executor:Executor=None, # Where `predict_batch` is run, the event loop's default executor by default
+    **kwargs, # Keyword arguments for `predict_batch`
+): # The results, for the endpoint to validate, or a `fastapi.Response` of them
+    """
+    Runs `predict_batch` on every item of a batch request in `executor`, and sends the results back with `respond`
+
+    When `accept` asks for `NDJSON_MEDIA_TYPE`, the results are streamed instead, running `predict_batch` one
+    mini-batch at a time with `iter_mini_batches`
+    """
+    if negotiate_media_type(accept, offered=[NDJSON_MEDIA_TYPE, *FAST_MEDIA_TYPES]) == NDJSON_MEDIA_TYPE:
+        results = iter_mini_batches(predict_batch, items, mini_batch_size, executor=executor, **kwargs)
+        return _fastapi_responses().StreamingResponse(ndjson_lines(results), media_type=NDJSON_MEDIA_TYPE)
+    if not items: return respond([], accept)
+    payload = await asyncio.get_event_loop().run_in_executor(
+        executor, partial(predict_batch, items, mini_batch_size=mini_batch_size, **kwargs)
+    )
+    return respond(payload, accept)
\ No newline at end of file
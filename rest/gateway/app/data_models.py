@@ -0,0 +1,157 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+
+# General Data Models
+class Labels(BaseModel):
+    value: str
+    confidence: float
+
+
+class Entities(BaseModel):
+    text: str
+    start_pos: int
+    end_pos: int
+    value: str
+    confidence: float
+
+
+# Token Tagging Data Model
+class TokenTaggingRequest(BaseModel):
+    text: str
+    model: Optional[str] = None
+
+
+class TokenTaggingResponse(BaseModel):
+    text: str
+    labels: List[Labels] = []
+    entities: List[Entities] = []
+
+
+class TokenTaggingBatchRequest(BaseModel):
+    text: List[str]
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+    model: Optional[str] = None
+
+
+# Sequence Classification
+class SequenceClassificationRequest(BaseModel):
+    text: str
+    model: Optional[str] = None
+
+
+class SequenceClassificationResponse(BaseModel):
+    text: str
+    labels: List[Labels] = []
+    entities: List[Entities] = []
+
+
+class SequenceClassificationBatchRequest(BaseModel):
+    text: List[str]
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+    model: Optional[str] = None
+
+
+# QA Label Object
+class QASpanLabel(BaseModel):
+    text: str
+    probability: float
+    start_logit: float
+    end_logit: float
+    start_index: int
+    end_index: int
+
+
+# Question Answering
+class QuestionAnsweringRequest(BaseModel):
+    query: List[str]
+    context: List[str]
+    top_n: int = 10
+    model: Optional[str] = None
+
+
+class QuestionAnsweringResponse(BaseModel):
+    best_answer: List[str]
+    best_n_answers: List[List[QASpanLabel]]
+
+
+class QuestionAnsweringBatchRequest(QuestionAnsweringRequest):
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+
+
+class QuestionAnsweringResult(BaseModel):
+    best_answer: str
+    best_n_answers: List[QASpanLabel]
+
+
+# Translation Request and Response
+class TranslationRequest(BaseModel):
+    text: List[str]
+    model: Optional[str] = None
+
+
+class TranslationResponse(BaseModel):
+    text: List[str]
+
+
+class TranslationBatchRequest(TranslationRequest):
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+
+
+class TranslationResult(BaseModel):
+    text: str
+
+
+# Summarization Request and Response
+class SummarizationRequest(BaseModel):
+    text: List[str]
+    min_length: int = 100
+    max_length: int = 500
+    model: Optional[str] = None
+
+
+class SummarizationResponse(BaseModel):
+    text: List[str]
+
+
+class SummarizationBatchRequest(SummarizationRequest):
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+
+
+class SummarizationResult(BaseModel):
+    text: str
+
+
+# Text Generation Request and Response
+class TextGenerationRequest(BaseModel):
+    text: str
+    num_tokens_to_produce: int = 50
+    model: Optional[str] = None
+
+
+class TextGenerationResponse(BaseModel):
+    text: List[str]
+
+
+class TextGenerationBatchRequest(BaseModel):
+    text: List[str]
+    num_tokens_to_produce: int = 50
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+    model: Optional[str] = None
+
+
+class TextGenerationResult(BaseModel):
+    text: str
+
+
+# Model Registry
+class LoadedModel(BaseModel):
+    task: str
+    name: str
+    size_mb: float
+
+
+class ModelsResponse(BaseModel):
+    configured: Dict[str, List[str]]
+    loaded: List[LoadedModel]
@@ -0,0 +1,468 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from adaptnlp import (
+    TransformersSequenceClassifier,
+    FlairSequenceClassifier,
+    TransformersQuestionAnswering,
+    TransformersSummarizer,
+    TransformersTranslator,
+    TransformersTextGenerator,
+)
+from adaptnlp.inference.token_classification import TransformersTokenTagger, FlairTokenTagger
+from adaptnlp.serving import (
+    MicroBatcher,
+    ModelRegistry,
+    respond,
+    respond_batch,
+)
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Header
+
+from .data_models import (
+    TokenTaggingRequest,
+    TokenTaggingBatchRequest,
+    TokenTaggingResponse,
+    SequenceClassificationRequest,
+    SequenceClassificationBatchRequest,
+    SequenceClassificationResponse,
+    QuestionAnsweringRequest,
+    QuestionAnsweringResponse,
+    QuestionAnsweringBatchRequest,
+    QuestionAnsweringResult,
+    TranslationRequest,
+    TranslationResponse,
+    TranslationBatchRequest,
+    TranslationResult,
+    SummarizationRequest,
+    SummarizationResponse,
+    SummarizationBatchRequest,
+    SummarizationResult,
+    TextGenerationRequest,
+    TextGenerationResponse,
+    TextGenerationBatchRequest,
+    TextGenerationResult,
+    ModelsResponse,
+)
+
+app = FastAPI()
+
+#####################
+### Initialization###
+#####################
+
+# Initialize Logging
+logger = logging.getLogger(__name__)
+logging.basicConfig(
+    level="INFO",
+    format="%(process)d-%(levelname)s-%(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+
+def _load_flair_or_transformers(flair_cls, transformers_cls):
+    """Returns a loader trying Flair first, the same way the `Easy` modules do"""
+
+    def load(name: str):
+        try:
+            return flair_cls.load(name)
+        except Exception:
+            return transformers_cls.load(name)
+
+    return load
+
+
+# Loaders of every task, keyed by the task's name
+_LOADERS = {
+    "token-tagging": _load_flair_or_transformers(FlairTokenTagger, TransformersTokenTagger),
+    "sequence-classification": _load_flair_or_transformers(
+        FlairSequenceClassifier, TransformersSequenceClassifier
+    ),
+    "question-answering": TransformersQuestionAnswering.load,
+    "translation": TransformersTranslator.load,
+    "summarization": TransformersSummarizer.load,
+    "text-generation": TransformersTextGenerator.load,
+}
+
+# Get Model Configurations From ENV VARS
+# Every task takes a comma separated list of the models requests may pick from, the first one is used by default.
+# Tasks without any models are not served
+_MODEL_ENV_VARS = {
+    "token-tagging": "TOKEN_TAGGING_MODEL",
+    "sequence-classification": "SEQUENCE_CLASSIFICATION_MODEL",
+    "question-answering": "QUESTION_ANSWERING_MODEL",
+    "translation": "TRANSLATION_MODEL",
+    "summarization": "SUMMARIZATION_MODEL",
+    "text-generation": "TEXT_GENERATION_MODEL",
+}
+_MODELS = {
+    task: [m.strip() for m in os.environ.get(var, "").split(",") if m.strip()]
+    for task, var in _MODEL_ENV_VARS.items()
+}
+_TOKEN_TAGGING_MODE = os.environ.get("TOKEN_TAGGING_MODE", "ner")
+_MAX_MODEL_MEMORY_MB = os.environ.get("MAX_MODEL_MEMORY_MB")
+_MAX_MODELS = os.environ.get("MAX_MODELS")
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", 5))
+_MINI_BATCH_SIZE = int(os.environ.get("MINI_BATCH_SIZE", 32))
+
+# Global Modules
+# Models of every task share one registry, loaded on first use and dropped least recently used first
+_REGISTRY = ModelRegistry(
+    _LOADERS,
+    max_memory_mb=None if _MAX_MODEL_MEMORY_MB is None else float(_MAX_MODEL_MEMORY_MB),
+    max_models=None if _MAX_MODELS is None else int(_MAX_MODELS),
+)
+
+
+def _model_name(task: str, requested: Optional[str]) -> str:
+    """The model a request for `task` runs on, `requested` if given or the task's default"""
+    models = _MODELS[task]
+    if not models:
+        raise HTTPException(
+            status_code=404, detail=f"No models are configured for {task}, set {_MODEL_ENV_VARS[task]}"
+        )
+    if requested is None:
+        return models[0]
+    if requested not in models:
+        raise HTTPException(
+            status_code=400, detail=f"{requested} is not one of the models served for {task}: {models}"
+        )
+    return requested
+
+
+def _tag_batch(texts: List[str], model_name: str, mini_batch_size: Optional[int] = None) -> List[dict]:
+    """Tags every text of a batch at once, returning the response payload of each text"""
+    tagger = _REGISTRY.get("token-tagging", model_name)
+    mini_batch_size = mini_batch_size or len(texts)
+    if isinstance(tagger, TransformersTokenTagger):
+        # Entity offsets of transformers models are character spans
+        sentences = tagger.predict(text=texts, mini_batch_size=mini_batch_size, detail_level="high")
+        return [
+            {
+                "text": text,
+                "labels": [],
+                "entities": [
+                    {
+                        "text": e["word"],
+                        "start_pos": e["offsets"][0],
+                        "end_pos": e["offsets"][1],
+                        "value": e["entity"],
+                        "confidence": e["score"],
+                    }
+                    for e in tags
+                ],
+            }
+            for text, tags in zip(texts, sentences["tags"])
+        ]
+
+    sentences = tagger.predict(text=texts, mini_batch_size=mini_batch_size)
+    payload = [sentence.to_dict(tag_type=_TOKEN_TAGGING_MODE) for sentence in sentences]
+
+    # Flatten each entity's label into it, so the payload only holds the response's fields
+    for p in payload:
+        for e in p["entities"]:
+            label = e.pop("labels")[0].to_dict()
+            e["value"], e["confidence"] = label["value"], label["confidence"]
+
+    return payload
+
+
+def _classify_batch(texts: List[str], model_name: str, mini_batch_size: Optional[int] = None) -> List[dict]:
+    """Classifies every text of a batch at once, returning the response payload of each text"""
+    classifier = _REGISTRY.get("sequence-classification", model_name)
+    mini_batch_size = mini_batch_size or len(texts)
+    if isinstance(classifier, TransformersSequenceClassifier):
+        sentences = classifier.predict(text=texts, mini_batch_size=mini_batch_size, detail_level=None)
+    else:
+        sentences = classifier.predict(text=texts, mini_batch_size=mini_batch_size)
+    return [sentence.to_dict() for sentence in sentences]
+
+
+def _answer_batch(
+    pairs: List[Tuple[str, str]], model_name: str, n_best_size: int, mini_batch_size: Optional[int] = None
+) -> List[dict]:
+    """Answers every `(query, context)` pair of a batch at once, returning the best answer and best n answers of each"""
+    queries, contexts = zip(*pairs)
+    examples, answers, n_best = _REGISTRY.get("question-answering", model_name).predict(
+        query=list(queries),
+        context=list(contexts),
+        n_best_size=n_best_size,
+        mini_batch_size=mini_batch_size or len(pairs),
+    )
+    return [{"best_answer": answers[e.qas_id], "best_n_answers": n_best[e.qas_id]} for e in examples]
+
+
+def _translate_batch(texts: List[str], model_name: str, mini_batch_size: Optional[int] = None) -> List[dict]:
+    """Translates every text of a batch at once, returning the response payload of each text"""
+    translations = _REGISTRY.get("translation", model_name).predict(
+        text=texts,
+        mini_batch_size=mini_batch_size or len(texts),
+        min_length=0,
+        max_length=500,
+        num_beams=1,
+    )["translations"]
+    return [{"text": translation} for translation in translations]
+
+
+def _summarize_batch(
+    texts: List[str], model_name: str, min_length: int, max_length: int, mini_batch_size: Optional[int] = None
+) -> List[dict]:
+    """Summarizes every text of a batch at once, returning the response payload of each text"""
+    summaries = _REGISTRY.get("summarization", model_name).predict(
+        text=texts,
+        mini_batch_size=mini_batch_size or len(texts),
+        min_length=min_length,
+        max_length=max_length,
+        num_beams=4,
+    )["summaries"]
+    return [{"text": summary} for summary in summaries]
+
+
+def _generate_batch(
+    texts: List[str], model_name: str, num_tokens_to_produce: int, mini_batch_size: Optional[int] = None
+) -> List[dict]:
+    """Continues every text of a batch at once, returning the response payload of each text"""
+    generated_text = _REGISTRY.get("text-generation", model_name).predict(
+        text=texts,
+        mini_batch_size=mini_batch_size or len(texts),
+        num_tokens_to_produce=num_tokens_to_produce,
+    )["generated_text"]
+    return [{"text": text} for text in generated_text]
+
+
+# Concurrent requests for the same model are run together in batches, and every model runs in the same thread
+_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+_BATCHERS = {
+    task: MicroBatcher(
+        predict_batch, max_batch_size=_MAX_BATCH_SIZE, max_wait_ms=_MAX_BATCH_WAIT_MS, executor=_EXECUTOR
+    )
+    for task, predict_batch in [
+        ("token-tagging", _tag_batch),
+        ("sequence-classification", _classify_batch),
+        ("question-answering", _answer_batch),
+        ("translation", _translate_batch),
+        ("summarization", _summarize_batch),
+        ("text-generation", _generate_batch),
+    ]
+}
+
+
+# Event Handling
+@app.on_event("shutdown")
+async def close_batchers():
+    for batcher in _BATCHERS.values():
+        batcher.close()
+    _EXECUTOR.shutdown(wait=False)
+
+
+######################
+### AdaptNLP API ###
+######################
+@app.get("/")
+async def root():
+    return {"message": "Welcome to AdaptNLP"}
+
+
+@app.get("/api/models", response_model=ModelsResponse)
+async def models():
+    return {"configured": _MODELS, "loaded": _REGISTRY.loaded()}
+
+
+@app.post("/api/token_tagger", response_model=List[TokenTaggingResponse])
+async def token_tagger(
+    token_tagging_request: TokenTaggingRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("token-tagging", token_tagging_request.model)
+    payload = [
+        await _BATCHERS["token-tagging"].submit(token_tagging_request.text, model_name=model_name)
+    ]
+    return respond(payload, accept)
+
+
+@app.post("/api/token_tagger/batch", response_model=List[TokenTaggingResponse])
+async def token_tagger_batch(
+    token_tagging_request: TokenTaggingBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("token-tagging", token_tagging_request.model)
+    return await respond_batch(
+        _tag_batch,
+        token_tagging_request.text,
+        token_tagging_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_EXECUTOR,
+        model_name=model_name,
+    )
+
+
+@app.post(
+    "/api/sequence-classifier", response_model=List[SequenceClassificationResponse]
+)
+async def sequence_classifier(
+    sequence_classification_request: SequenceClassificationRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("sequence-classification", sequence_classification_request.model)
+    payload = [
+        await _BATCHERS["sequence-classification"].submit(
+            sequence_classification_request.text, model_name=model_name
+        )
+    ]
+    return respond(payload, accept)
+
+
+@app.post(
+    "/api/sequence-classifier/batch", response_model=List[SequenceClassificationResponse]
+)
+async def sequence_classifier_batch(
+    sequence_classification_request: SequenceClassificationBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("sequence-classification", sequence_classification_request.model)
+    return await respond_batch(
+        _classify_batch,
+        sequence_classification_request.text,
+        sequence_classification_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_EXECUTOR,
+        model_name=model_name,
+    )
+
+
+@app.post("/api/question-answering", response_model=QuestionAnsweringResponse)
+async def question_answering(
+    qa_request: QuestionAnsweringRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("question-answering", qa_request.model)
+    answers = await _BATCHERS["question-answering"].submit_many(
+        list(zip(qa_request.query, qa_request.context)),
+        model_name=model_name,
+        n_best_size=qa_request.top_n,
+    )
+    payload = {
+        "best_answer": [answer["best_answer"] for answer in answers],
+        "best_n_answers": [answer["best_n_answers"] for answer in answers],
+    }
+    return respond(payload, accept)
+
+
+@app.post("/api/question-answering/batch", response_model=List[QuestionAnsweringResult])
+async def question_answering_batch(
+    qa_request: QuestionAnsweringBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("question-answering", qa_request.model)
+    return await respond_batch(
+        _answer_batch,
+        list(zip(qa_request.query, qa_request.context)),
+        qa_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_EXECUTOR,
+        model_name=model_name,
+        n_best_size=qa_request.top_n,
+    )
+
+
+@app.post("/api/translator", response_model=TranslationResponse)
+async def translator(
+    translator_request: TranslationRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("translation", translator_request.model)
+    translations = await _BATCHERS["translation"].submit_many(
+        translator_request.text, model_name=model_name
+    )
+    payload = {"text": [translation["text"] for translation in translations]}
+    return respond(payload, accept)
+
+
+@app.post("/api/translator/batch", response_model=List[TranslationResult])
+async def translator_batch(
+    translator_request: TranslationBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("translation", translator_request.model)
+    return await respond_batch(
+        _translate_batch,
+        translator_request.text,
+        translator_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_EXECUTOR,
+        model_name=model_name,
+    )
+
+
+@app.post("/api/summarizer", response_model=SummarizationResponse)
+async def summarizer(
+    summarizer_request: SummarizationRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("summarization", summarizer_request.model)
+    summaries = await _BATCHERS["summarization"].submit_many(
+        summarizer_request.text,
+        model_name=model_name,
+        min_length=summarizer_request.min_length,
+        max_length=summarizer_request.max_length,
+    )
+    payload = {"text": [summary["text"] for summary in summaries]}
+    return respond(payload, accept)
+
+
+@app.post("/api/summarizer/batch", response_model=List[SummarizationResult])
+async def summarizer_batch(
+    summarizer_request: SummarizationBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("summarization", summarizer_request.model)
+    return await respond_batch(
+        _summarize_batch,
+        summarizer_request.text,
+        summarizer_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_EXECUTOR,
+        model_name=model_name,
+        min_length=summarizer_request.min_length,
+        max_length=summarizer_request.max_length,
+    )
+
+
+@app.post("/api/text-generator", response_model=TextGenerationResponse)
+async def text_generator(
+    text_generator_request: TextGenerationRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("text-generation", text_generator_request.model)
+    generated_text = await _BATCHERS["text-generation"].submit(
+        text_generator_request.text,
+        model_name=model_name,
+        num_tokens_to_produce=text_generator_request.num_tokens_to_produce,
+    )
+    payload = {"text": [generated_text["text"]]}
+    return respond(payload, accept)
+
+
+@app.post("/api/text-generator/batch", response_model=List[TextGenerationResult])
+async def text_generator_batch(
+    text_generator_request: TextGenerationBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    model_name = _model_name("text-generation", text_generator_request.model)
+    return await respond_batch(
+        _generate_batch,
+        text_generator_request.text,
+        text_generator_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_EXECUTOR,
+        model_name=model_name,
+        num_tokens_to_produce=text_generator_request.num_tokens_to_produce,
+    )
+
+
+if __name__ == "__main__":
+    uvicorn.run(app, host="0.0.0.0", port=5000)
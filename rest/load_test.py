@@ -0,0 +1,111 @@
+"""Load test for the AdaptNLP rest services
+
+Sends requests to a running service from many concurrent clients, and reports latency percentiles and throughput.
+Run it once against a service started with `MAX_BATCH_SIZE=1`, which runs every request on its own, and once with
+batching on to compare the two:
+
+    python load_test.py --task token-tagging --concurrency 32 --requests 2000
+"""
+import argparse
+import json
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# The endpoint and an example request body of each service
+TASKS = {
+    "token-tagging": (
+        "/api/token_tagger",
+        {"text": "Novetta Solutions is the best. Albert Einstein used to be employed at Novetta Solutions."},
+    ),
+    "sequence-classification": (
+        "/api/sequence-classifier",
+        {"text": "Novetta Solutions is the best. Albert Einstein used to be employed at Novetta Solutions."},
+    ),
+    "question-answering": (
+        "/api/question-answering",
+        {
+            "query": ["What is the meaning of life?"],
+            "context": ["Machine Learning is the meaning of life."],
+            "top_n": 5,
+        },
+    ),
+    "translation": ("/api/translator", {"text": ["Machine learning will take over the world very soon."]}),
+    "summarization": (
+        "/api/summarizer",
+        {
+            "text": [
+                "Einstein's work is also known for its influence on the philosophy of science. In 1905 he published "
+                "four groundbreaking papers, outlining the theory of the photoelectric effect, explaining Brownian "
+                "motion, introducing special relativity, and demonstrating mass-energy equivalence."
+            ],
+            "min_length": 10,
+            "max_length": 50,
+        },
+    ),
+    "text-generation": ("/api/text-generator", {"text": "China and the U.S. will begin to", "num_tokens_to_produce": 20}),
+}
+
+
+def percentile(latencies, q):
+    "The `q`th percentile of sorted `latencies`, using the nearest rank"
+    return latencies[min(len(latencies) - 1, max(0, round(q / 100 * len(latencies)) - 1))]
+
+
+def send(url, body, accept):
+    "Posts `body` to `url` asking for an `accept` response, returning the latency in seconds"
+    request = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json", "Accept": accept})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read()
+    return time.perf_counter() - start
+
+
+def run(url, body, accept, concurrency, n_requests, warmup):
+    "Sends `n_requests` requests from `concurrency` clients at once, returning the latency of each and the total time"
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: send(url, body, accept), range(warmup)))
+        start = time.perf_counter()
+        latencies = list(pool.map(lambda _: send(url, body, accept), range(n_requests)))
+        elapsed = time.perf_counter() - start
+    return sorted(latencies), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--task", choices=sorted(TASKS), required=True, help="The service being tested")
+    parser.add_argument("--host", default="http://localhost:5000", help="Where the service is running")
+    parser.add_argument("--payload", help="A JSON file with the request body, instead of the task's example")
+    parser.add_argument(
+        "--accept", default="application/json", help="The response format asked for, such as application/msgpack"
+    )
+    parser.add_argument("--concurrency", type=int, default=32, help="Number of clients sending requests at once")
+    parser.add_argument("--requests", type=int, default=1000, help="Number of timed requests")
+    parser.add_argument("--warmup", type=int, default=32, help="Number of untimed requests sent first")
+    parser.add_argument("--label", default="", help="A name for this run in the report, such as the batch size")
+    args = parser.parse_args()
+
+    path, payload = TASKS[args.task]
+    if args.payload is not None:
+        with open(args.payload) as f:
+            payload = json.load(f)
+    body = json.dumps(payload).encode()
+
+    latencies, elapsed = run(args.host + path, body, args.accept, args.concurrency, args.requests, args.warmup)
+    report = {
+        "label": args.label,
+        "task": args.task,
+        "accept": args.accept,
+        "concurrency": args.concurrency,
+        "requests": len(latencies),
+        "throughput_rps": len(latencies) / elapsed,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
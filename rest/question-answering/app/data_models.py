@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 # QA Label Object
@@ -23,3 +23,12 @@ class QuestionAnsweringRequest(BaseModel):
 class QuestionAnsweringResponse(BaseModel):
     best_answer: List[str]
     best_n_answers: List[List[QASpanLabel]]
+
+
+class QuestionAnsweringBatchRequest(QuestionAnsweringRequest):
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+
+
+class QuestionAnsweringResult(BaseModel):
+    best_answer: str
+    best_n_answers: List[QASpanLabel]
@@ -1,15 +1,23 @@
 import os
 import logging
-from typing import List
+from typing import List, Optional, Tuple
 
 import adaptnlp
+from adaptnlp.serving import (
+    MicroBatcher,
+    InferenceWorkerPool,
+    respond,
+    respond_batch,
+)
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
 
 from .data_models import (
     QuestionAnsweringRequest,
     QuestionAnsweringResponse,
+    QuestionAnsweringBatchRequest,
+    QuestionAnsweringResult,
 )
 
 app = FastAPI()
@@ -31,11 +39,56 @@ _QA_MODEL = adaptnlp.EasyQuestionAnswering()
 
 # Get Model Configurations From ENV VARS
 _QUESTION_ANSWERING_MODEL = os.environ["QUESTION_ANSWERING_MODEL"]
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", 5))
+_MINI_BATCH_SIZE = int(os.environ.get("MINI_BATCH_SIZE", 32))
+_INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+_THREADS_PER_WORKER = os.environ.get("THREADS_PER_WORKER")
+
+# Worker processes sharing the model's weights, started once it is loaded if `INFERENCE_WORKERS` is set
+_POOL = None
+
+
+def _run(method: str, **kwargs):
+    """Calls `method` of `_QA_MODEL` in a worker process if there are any, or in this one"""
+    if _POOL is None:
+        return getattr(_QA_MODEL, method)(**kwargs)
+    return _POOL.run(method, **kwargs)
+
+
+def _answer_batch(
+    pairs: List[Tuple[str, str]], n_best_size: int, mini_batch_size: Optional[int] = None
+) -> List[dict]:
+    """Answers every `(query, context)` pair of a batch at once, returning the best answer and best n answers of each"""
+    queries, contexts = zip(*pairs)
+    result = _run(
+        "predict_qa",
+        query=list(queries),
+        context=list(contexts),
+        n_best_size=n_best_size,
+        mini_batch_size=mini_batch_size or len(pairs),
+        model_name_or_path=_QUESTION_ANSWERING_MODEL,
+        detail_level="high",
+    )
+    return [
+        {"best_answer": best_answer, "best_n_answers": best_n_answers}
+        for best_answer, best_n_answers in zip(result["best_answers"], result["n_best_json"].values())
+    ]
+
+
+# Concurrent requests are answered together in batches
+_BATCHER = MicroBatcher(
+    _answer_batch,
+    max_batch_size=_MAX_BATCH_SIZE,
+    max_wait_ms=_MAX_BATCH_WAIT_MS,
+    max_in_flight=max(1, _INFERENCE_WORKERS),
+)
 
 
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _POOL
     _QA_MODEL.predict_qa(
         query="-",
         context="______________________________________________________________________________",
@@ -43,6 +96,19 @@ async def initialize_nlp_task_modules():
         mini_batch_size=1,
         model_name_or_path=_QUESTION_ANSWERING_MODEL,
     )
+    if _INFERENCE_WORKERS > 0:
+        _POOL = InferenceWorkerPool(
+            _QA_MODEL,
+            n_workers=_INFERENCE_WORKERS,
+            num_threads=None if _THREADS_PER_WORKER is None else int(_THREADS_PER_WORKER),
+        )
+
+
+@app.on_event("shutdown")
+async def close_batcher():
+    _BATCHER.close()
+    if _POOL is not None:
+        _POOL.close()
 
 
 ######################
@@ -54,22 +120,33 @@ async def root():
 
 
 @app.post("/api/question-answering", response_model=QuestionAnsweringResponse)
-async def question_answering(qa_request: QuestionAnsweringRequest):
-    query = qa_request.query
-    context = qa_request.context
-    top_n = qa_request.top_n
-    best_answer, best_n_answers = _QA_MODEL.predict_qa(
-        query=query,
-        context=context,
-        n_best_size=top_n,
-        mini_batch_size=1,
-        model_name_or_path=_QUESTION_ANSWERING_MODEL,
+async def question_answering(
+    qa_request: QuestionAnsweringRequest,
+    accept: Optional[str] = Header(None),
+):
+    answers = await _BATCHER.submit_many(
+        list(zip(qa_request.query, qa_request.context)), n_best_size=qa_request.top_n
     )
-    payload = QuestionAnsweringResponse(
-        best_answer=list(best_answer.values()),
-        best_n_answers=list(best_n_answers.values()),
+    payload = {
+        "best_answer": [answer["best_answer"] for answer in answers],
+        "best_n_answers": [answer["best_n_answers"] for answer in answers],
+    }
+    return respond(payload, accept)
+
+
+@app.post("/api/question-answering/batch", response_model=List[QuestionAnsweringResult])
+async def question_answering_batch(
+    qa_request: QuestionAnsweringBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    return await respond_batch(
+        _answer_batch,
+        list(zip(qa_request.query, qa_request.context)),
+        qa_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_BATCHER.executor,
+        n_best_size=qa_request.top_n,
     )
-    return payload
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 # General Data Models
@@ -22,6 +22,11 @@ class SequenceClassificationRequest(BaseModel):
     text: str
 
 
+class SequenceClassificationBatchRequest(BaseModel):
+    text: List[str]
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+
+
 class SequenceClassificationResponse(BaseModel):
     text: str
     labels: List[Labels] = []
@@ -1,14 +1,21 @@
 import os
 import logging
-from typing import List
+from typing import List, Optional
 
 import adaptnlp
+from adaptnlp.serving import (
+    MicroBatcher,
+    InferenceWorkerPool,
+    respond,
+    respond_batch,
+)
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
 
 from .data_models import (
     SequenceClassificationRequest,
+    SequenceClassificationBatchRequest,
     SequenceClassificationResponse,
 )
 
@@ -31,14 +38,64 @@ _SEQUENCE_CLASSIFIER = adaptnlp.EasySequenceClassifier()
 
 # Get Model Configurations From ENV VARS
 _SEQUENCE_CLASSIFICATION_MODEL = os.environ["SEQUENCE_CLASSIFICATION_MODEL"]
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", 5))
+_MINI_BATCH_SIZE = int(os.environ.get("MINI_BATCH_SIZE", 32))
+_INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+_THREADS_PER_WORKER = os.environ.get("THREADS_PER_WORKER")
+
+# Worker processes sharing the model's weights, started once it is loaded if `INFERENCE_WORKERS` is set
+_POOL = None
+
+
+def _run(method: str, **kwargs):
+    """Calls `method` of `_SEQUENCE_CLASSIFIER` in a worker process if there are any, or in this one"""
+    if _POOL is None:
+        return getattr(_SEQUENCE_CLASSIFIER, method)(**kwargs)
+    return _POOL.run(method, **kwargs)
+
+
+def _classify_batch(texts: List[str], mini_batch_size: Optional[int] = None) -> List[dict]:
+    """Classifies every text of a batch at once, returning the response payload of each text"""
+    sentences = _run(
+        "tag_text",
+        text=texts,
+        mini_batch_size=mini_batch_size or len(texts),
+        model_name_or_path=_SEQUENCE_CLASSIFICATION_MODEL,
+        detail_level=None,
+    )
+    return [sentence.to_dict() for sentence in sentences]
+
+
+# Concurrent requests are classified together in batches
+_BATCHER = MicroBatcher(
+    _classify_batch,
+    max_batch_size=_MAX_BATCH_SIZE,
+    max_wait_ms=_MAX_BATCH_WAIT_MS,
+    max_in_flight=max(1, _INFERENCE_WORKERS),
+)
 
 
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _POOL
     _SEQUENCE_CLASSIFIER.tag_text(
         text="", mini_batch_size=1, model_name_or_path=_SEQUENCE_CLASSIFICATION_MODEL
     )
+    if _INFERENCE_WORKERS > 0:
+        _POOL = InferenceWorkerPool(
+            _SEQUENCE_CLASSIFIER,
+            n_workers=_INFERENCE_WORKERS,
+            num_threads=None if _THREADS_PER_WORKER is None else int(_THREADS_PER_WORKER),
+        )
+
+
+@app.on_event("shutdown")
+async def close_batcher():
+    _BATCHER.close()
+    if _POOL is not None:
+        _POOL.close()
 
 
 ######################
@@ -54,13 +111,26 @@ async def root():
 )
 async def sequence_classifier(
     sequence_classification_request: SequenceClassificationRequest,
+    accept: Optional[str] = Header(None),
+):
+    payload = [await _BATCHER.submit(sequence_classification_request.text)]
+    return respond(payload, accept)
+
+
+@app.post(
+    "/api/sequence-classifier/batch", response_model=List[SequenceClassificationResponse]
+)
+async def sequence_classifier_batch(
+    sequence_classification_request: SequenceClassificationBatchRequest,
+    accept: Optional[str] = Header(None),
 ):
-    text = sequence_classification_request.text
-    sentences = _SEQUENCE_CLASSIFIER.tag_text(
-        text=text, mini_batch_size=1, model_name_or_path=_SEQUENCE_CLASSIFICATION_MODEL
+    return await respond_batch(
+        _classify_batch,
+        sequence_classification_request.text,
+        sequence_classification_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_BATCHER.executor,
     )
-    payload = [sentence.to_dict() for sentence in sentences]
-    return payload
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 # Summarization Request and Response
 class SummarizationRequest(BaseModel):
@@ -11,3 +11,11 @@ class SummarizationRequest(BaseModel):
 
 class SummarizationResponse(BaseModel):
     text: List[str]
+
+
+class SummarizationBatchRequest(SummarizationRequest):
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+
+
+class SummarizationResult(BaseModel):
+    text: str
@@ -1,15 +1,23 @@
 import os
 import logging
-from typing import List
+from typing import List, Optional
 
 import adaptnlp
+from adaptnlp.serving import (
+    MicroBatcher,
+    InferenceWorkerPool,
+    respond,
+    respond_batch,
+)
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
 
 from .data_models import (
     SummarizationRequest,
     SummarizationResponse,
+    SummarizationBatchRequest,
+    SummarizationResult,
 )
 
 app = FastAPI()
@@ -31,11 +39,52 @@ _SUMMARIZER = adaptnlp.EasySummarizer()
 
 # Get Model Configurations From ENV VARS
 _SUMMARIZATION_MODEL = os.environ["SUMMARIZATION_MODEL"]
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", 5))
+_MINI_BATCH_SIZE = int(os.environ.get("MINI_BATCH_SIZE", 32))
+_INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+_THREADS_PER_WORKER = os.environ.get("THREADS_PER_WORKER")
+
+# Worker processes sharing the model's weights, started once it is loaded if `INFERENCE_WORKERS` is set
+_POOL = None
+
+
+def _run(method: str, **kwargs):
+    """Calls `method` of `_SUMMARIZER` in a worker process if there are any, or in this one"""
+    if _POOL is None:
+        return getattr(_SUMMARIZER, method)(**kwargs)
+    return _POOL.run(method, **kwargs)
+
+
+def _summarize_batch(
+    texts: List[str], min_length: int, max_length: int, mini_batch_size: Optional[int] = None
+) -> List[dict]:
+    """Summarizes every text of a batch at once, returning the response payload of each text"""
+    summaries = _run(
+        "summarize",
+        text=texts,
+        mini_batch_size=mini_batch_size or len(texts),
+        model_name_or_path=_SUMMARIZATION_MODEL,
+        min_length=min_length,
+        max_length=max_length,
+        num_beams=4,
+    )["summaries"]
+    return [{"text": summary} for summary in summaries]
+
+
+# Concurrent requests are summarized together in batches
+_BATCHER = MicroBatcher(
+    _summarize_batch,
+    max_batch_size=_MAX_BATCH_SIZE,
+    max_wait_ms=_MAX_BATCH_WAIT_MS,
+    max_in_flight=max(1, _INFERENCE_WORKERS),
+)
 
 
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _POOL
     _SUMMARIZER.summarize(
         text="",
         mini_batch_size=1,
@@ -45,6 +94,19 @@ async def initialize_nlp_task_modules():
         num_beams=4,
         early_stopping=True,
     )
+    if _INFERENCE_WORKERS > 0:
+        _POOL = InferenceWorkerPool(
+            _SUMMARIZER,
+            n_workers=_INFERENCE_WORKERS,
+            num_threads=None if _THREADS_PER_WORKER is None else int(_THREADS_PER_WORKER),
+        )
+
+
+@app.on_event("shutdown")
+async def close_batcher():
+    _BATCHER.close()
+    if _POOL is not None:
+        _POOL.close()
 
 
 ######################
@@ -58,21 +120,31 @@ async def root():
 @app.post("/api/summarizer", response_model=SummarizationResponse)
 async def translator(
     summarizer_request: SummarizationRequest,
+    accept: Optional[str] = Header(None),
 ):
-    text = summarizer_request.text
-    min_length = summarizer_request.min_length
-    max_length = summarizer_request.max_length
+    summaries = await _BATCHER.submit_many(
+        summarizer_request.text,
+        min_length=summarizer_request.min_length,
+        max_length=summarizer_request.max_length,
+    )
+    payload = {"text": [summary["text"] for summary in summaries]}
+    return respond(payload, accept)
 
-    summaries = _SUMMARIZER.summarize(
-        text=text,
-        mini_batch_size=1,
-        model_name_or_path=_SUMMARIZATION_MODEL,
-        min_length=min_length,
-        max_length=max_length,
-        num_beams=4,
+
+@app.post("/api/summarizer/batch", response_model=List[SummarizationResult])
+async def summarizer_batch(
+    summarizer_request: SummarizationBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    return await respond_batch(
+        _summarize_batch,
+        summarizer_request.text,
+        summarizer_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_BATCHER.executor,
+        min_length=summarizer_request.min_length,
+        max_length=summarizer_request.max_length,
     )
-    payload = {"text": summaries}
-    return payload
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 # Summarization Request and Response
 class TextGenerationRequest(BaseModel):
@@ -10,3 +10,13 @@ class TextGenerationRequest(BaseModel):
 
 class TextGenerationResponse(BaseModel):
     text: List[str]
+
+
+class TextGenerationBatchRequest(BaseModel):
+    text: List[str]
+    num_tokens_to_produce: int = 50
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+
+
+class TextGenerationResult(BaseModel):
+    text: str
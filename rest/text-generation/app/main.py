@@ -1,15 +1,23 @@
 import os
 import logging
-from typing import List
+from typing import List, Optional
 
 import adaptnlp
+from adaptnlp.serving import (
+    MicroBatcher,
+    InferenceWorkerPool,
+    respond,
+    respond_batch,
+)
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
 
 from .data_models import (
     TextGenerationRequest,
     TextGenerationResponse,
+    TextGenerationBatchRequest,
+    TextGenerationResult,
 )
 
 app = FastAPI()
@@ -31,17 +39,69 @@ _TEXT_GENERATOR = adaptnlp.EasyTextGenerator()
 
 # Get Model Configurations From ENV VARS
 _TEXT_GENERATION_MODEL = os.environ["TEXT_GENERATION_MODEL"]
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", 5))
+_MINI_BATCH_SIZE = int(os.environ.get("MINI_BATCH_SIZE", 32))
+_INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+_THREADS_PER_WORKER = os.environ.get("THREADS_PER_WORKER")
+
+# Worker processes sharing the model's weights, started once it is loaded if `INFERENCE_WORKERS` is set
+_POOL = None
+
+
+def _run(method: str, **kwargs):
+    """Calls `method` of `_TEXT_GENERATOR` in a worker process if there are any, or in this one"""
+    if _POOL is None:
+        return getattr(_TEXT_GENERATOR, method)(**kwargs)
+    return _POOL.run(method, **kwargs)
+
+
+def _generate_batch(
+    texts: List[str], num_tokens_to_produce: int, mini_batch_size: Optional[int] = None
+) -> List[dict]:
+    """Continues every text of a batch at once, returning the response payload of each text"""
+    generated_text = _run(
+        "generate",
+        text=texts,
+        mini_batch_size=mini_batch_size or len(texts),
+        model_name_or_path=_TEXT_GENERATION_MODEL,
+        num_tokens_to_produce=num_tokens_to_produce,
+    )["generated_text"]
+    return [{"text": text} for text in generated_text]
+
+
+# Concurrent requests are generated together in batches
+_BATCHER = MicroBatcher(
+    _generate_batch,
+    max_batch_size=_MAX_BATCH_SIZE,
+    max_wait_ms=_MAX_BATCH_WAIT_MS,
+    max_in_flight=max(1, _INFERENCE_WORKERS),
+)
 
 
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _POOL
     _TEXT_GENERATOR.generate(
         text="test",
         mini_batch_size=1,
         model_name_or_path=_TEXT_GENERATION_MODEL,
         num_tokens_to_produce=50,
     )
+    if _INFERENCE_WORKERS > 0:
+        _POOL = InferenceWorkerPool(
+            _TEXT_GENERATOR,
+            n_workers=_INFERENCE_WORKERS,
+            num_threads=None if _THREADS_PER_WORKER is None else int(_THREADS_PER_WORKER),
+        )
+
+
+@app.on_event("shutdown")
+async def close_batcher():
+    _BATCHER.close()
+    if _POOL is not None:
+        _POOL.close()
 
 
 ######################
@@ -55,18 +115,29 @@ async def root():
 @app.post("/api/text-generator", response_model=TextGenerationResponse)
 async def translator(
     text_generator_request: TextGenerationRequest,
+    accept: Optional[str] = Header(None),
 ):
-    text = text_generator_request.text
-    num_tokens_to_produce = text_generator_request.num_tokens_to_produce
+    generated_text = await _BATCHER.submit(
+        text_generator_request.text,
+        num_tokens_to_produce=text_generator_request.num_tokens_to_produce,
+    )
+    payload = {"text": [generated_text["text"]]}
+    return respond(payload, accept)
 
-    generated_text = _TEXT_GENERATOR.generate(
-        text=text,
-        mini_batch_size=1,
-        model_name_or_path=_TEXT_GENERATION_MODEL,
-        num_tokens_to_produce=num_tokens_to_produce,
+
+@app.post("/api/text-generator/batch", response_model=List[TextGenerationResult])
+async def text_generator_batch(
+    text_generator_request: TextGenerationBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    return await respond_batch(
+        _generate_batch,
+        text_generator_request.text,
+        text_generator_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_BATCHER.executor,
+        num_tokens_to_produce=text_generator_request.num_tokens_to_produce,
     )
-    payload = {"text": generated_text}
-    return payload
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 # General Data Models
@@ -22,6 +22,11 @@ class TokenTaggingRequest(BaseModel):
     text: str
 
 
+class TokenTaggingBatchRequest(BaseModel):
+    text: List[str]
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+
+
 class TokenTaggingResponse(BaseModel):
     text: str
     labels: List[Labels] = []
@@ -1,14 +1,21 @@
 import os
 import logging
-from typing import List
+from typing import List, Optional
 
 import adaptnlp
+from adaptnlp.serving import (
+    MicroBatcher,
+    InferenceWorkerPool,
+    respond,
+    respond_batch,
+)
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
 
 from .data_models import (
     TokenTaggingRequest,
+    TokenTaggingBatchRequest,
     TokenTaggingResponse,
 )
 
@@ -32,11 +39,91 @@ _TOKEN_TAGGER = adaptnlp.EasyTokenTagger()
 # Get Model Configurations From ENV VARS
 _TOKEN_TAGGING_MODE = os.environ["TOKEN_TAGGING_MODE"]
 _TOKEN_TAGGING_MODEL = os.environ["TOKEN_TAGGING_MODEL"]
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", 5))
+_MINI_BATCH_SIZE = int(os.environ.get("MINI_BATCH_SIZE", 32))
+_INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+_THREADS_PER_WORKER = os.environ.get("THREADS_PER_WORKER")
+
+# Worker processes sharing the model's weights, started once it is loaded if `INFERENCE_WORKERS` is set
+_POOL = None
+
+
+def _run(method: str, **kwargs):
+    """Calls `method` of `_TOKEN_TAGGER` in a worker process if there are any, or in this one"""
+    if _POOL is None:
+        return getattr(_TOKEN_TAGGER, method)(**kwargs)
+    return _POOL.run(method, **kwargs)
+
+
+def _tag_batch(texts: List[str], mini_batch_size: Optional[int] = None) -> List[dict]:
+    """Tags every text of a batch at once, returning the response payload of each text"""
+    sentences = _run(
+        "tag_text",
+        text=texts,
+        model_name_or_path=_TOKEN_TAGGING_MODEL,
+        mini_batch_size=mini_batch_size or len(texts),
+        detail_level="high",
+    )
+
+    # Check if transformers model return type, whose entity offsets are character spans
+    if isinstance(sentences, dict):
+        return [
+            {
+                "text": text,
+                "labels": [],
+                "entities": [
+                    {
+                        "text": e["word"],
+                        "start_pos": e["offsets"][0],
+                        "end_pos": e["offsets"][1],
+                        "value": e["entity"],
+                        "confidence": e["score"],
+                    }
+                    for e in tags
+                ],
+            }
+            for text, tags in zip(texts, sentences["tags"])
+        ]
+
+    payload = [sentence.to_dict(tag_type=_TOKEN_TAGGING_MODE) for sentence in sentences]
+
+    # Flatten each entity's label into it, so the payload only holds the response's fields
+    for p in payload:
+        for e in p["entities"]:
+            label = e.pop("labels")[0].to_dict()
+            e["value"], e["confidence"] = label["value"], label["confidence"]
+
+    return payload
+
+
+# Concurrent requests are tagged together in batches
+_BATCHER = MicroBatcher(
+    _tag_batch,
+    max_batch_size=_MAX_BATCH_SIZE,
+    max_wait_ms=_MAX_BATCH_WAIT_MS,
+    max_in_flight=max(1, _INFERENCE_WORKERS),
+)
+
 
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _POOL
     _TOKEN_TAGGER.tag_text(text="", model_name_or_path=_TOKEN_TAGGING_MODEL)
+    if _INFERENCE_WORKERS > 0:
+        _POOL = InferenceWorkerPool(
+            _TOKEN_TAGGER,
+            n_workers=_INFERENCE_WORKERS,
+            num_threads=None if _THREADS_PER_WORKER is None else int(_THREADS_PER_WORKER),
+        )
+
+
+@app.on_event("shutdown")
+async def close_batcher():
+    _BATCHER.close()
+    if _POOL is not None:
+        _POOL.close()
 
 
 ######################
@@ -48,39 +135,27 @@ async def root():
 
 
 @app.post("/api/token_tagger", response_model=List[TokenTaggingResponse])
-async def token_tagger(token_tagging_request: TokenTaggingRequest):
-    text = token_tagging_request.text
-    sentences = _TOKEN_TAGGER.tag_text(
-        text=text, model_name_or_path=_TOKEN_TAGGING_MODEL
+async def token_tagger(
+    token_tagging_request: TokenTaggingRequest,
+    accept: Optional[str] = Header(None),
+):
+    payload = [await _BATCHER.submit(token_tagging_request.text)]
+    return respond(payload, accept)
+
+
+@app.post("/api/token_tagger/batch", response_model=List[TokenTaggingResponse])
+async def token_tagger_batch(
+    token_tagging_request: TokenTaggingBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    return await respond_batch(
+        _tag_batch,
+        token_tagging_request.text,
+        token_tagging_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_BATCHER.executor,
     )
 
-    # Check if transformers model return type
-    if len(sentences) > 0 and isinstance(sentences[0], List):
-        payload = [{"text": text, "labels": [], "entities": s} for s in sentences]
-
-        # Need a better way to serialize
-        for p in payload:
-            entities = p["entities"]
-            for e in entities:
-                e["text"] = e["word"]
-                e["start_pos"] = e["offsets"][0]
-                e["end_pos"] = e["offsets"][1]
-                e["value"] = e["entity_group"]
-                e["confidence"] = e["score"]
-        return payload
-
-    payload = [sentence.to_dict(tag_type=_TOKEN_TAGGING_MODE) for sentence in sentences]
-
-    # Need a better way to serialize
-    for p in payload:
-        entities = p["entities"]
-        for e in entities:
-            labels = e["labels"]
-            e["value"] = labels[0].to_dict()["value"]
-            e["confidence"] = labels[0].to_dict()["confidence"]
-
-    return payload
-
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=5000)
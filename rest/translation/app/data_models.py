@@ -1,6 +1,6 @@
-from typing import List
+from typing import List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 # Translation Request and Response
 class TranslationRequest(BaseModel):
@@ -9,3 +9,11 @@ class TranslationRequest(BaseModel):
 
 class TranslationResponse(BaseModel):
     text: List[str]
+
+
+class TranslationBatchRequest(TranslationRequest):
+    mini_batch_size: Optional[int] = Field(None, ge=1)
+
+
+class TranslationResult(BaseModel):
+    text: str
@@ -1,15 +1,23 @@
 import os
 import logging
-from typing import List
+from typing import List, Optional
 
 import adaptnlp
+from adaptnlp.serving import (
+    MicroBatcher,
+    InferenceWorkerPool,
+    respond,
+    respond_batch,
+)
 
 import uvicorn
-from fastapi import FastAPI
+from fastapi import FastAPI, Header
 
 from .data_models import (
     TranslationRequest,
     TranslationResponse,
+    TranslationBatchRequest,
+    TranslationResult,
 )
 
 app = FastAPI()
@@ -31,11 +39,50 @@ _TRANSLATOR = adaptnlp.EasyTranslator()
 
 # Get Model Configurations From ENV VARS
 _TRANSLATION_MODEL = os.environ["TRANSLATION_MODEL"]
+_MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 32))
+_MAX_BATCH_WAIT_MS = float(os.environ.get("MAX_BATCH_WAIT_MS", 5))
+_MINI_BATCH_SIZE = int(os.environ.get("MINI_BATCH_SIZE", 32))
+_INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", 0))
+_THREADS_PER_WORKER = os.environ.get("THREADS_PER_WORKER")
+
+# Worker processes sharing the model's weights, started once it is loaded if `INFERENCE_WORKERS` is set
+_POOL = None
+
+
+def _run(method: str, **kwargs):
+    """Calls `method` of `_TRANSLATOR` in a worker process if there are any, or in this one"""
+    if _POOL is None:
+        return getattr(_TRANSLATOR, method)(**kwargs)
+    return _POOL.run(method, **kwargs)
+
+
+def _translate_batch(texts: List[str], mini_batch_size: Optional[int] = None) -> List[dict]:
+    """Translates every text of a batch at once, returning the response payload of each text"""
+    translations = _run(
+        "translate",
+        text=texts,
+        mini_batch_size=mini_batch_size or len(texts),
+        model_name_or_path=_TRANSLATION_MODEL,
+        min_length=0,
+        max_length=500,
+        num_beams=1,
+    )["translations"]
+    return [{"text": translation} for translation in translations]
+
+
+# Concurrent requests are translated together in batches
+_BATCHER = MicroBatcher(
+    _translate_batch,
+    max_batch_size=_MAX_BATCH_SIZE,
+    max_wait_ms=_MAX_BATCH_WAIT_MS,
+    max_in_flight=max(1, _INFERENCE_WORKERS),
+)
 
 
 # Event Handling
 @app.on_event("startup")
 async def initialize_nlp_task_modules():
+    global _POOL
     _TRANSLATOR.translate(
         text="",
         mini_batch_size=1,
@@ -44,6 +91,19 @@ async def initialize_nlp_task_modules():
         max_length=500,
         num_beams=1,
     )
+    if _INFERENCE_WORKERS > 0:
+        _POOL = InferenceWorkerPool(
+            _TRANSLATOR,
+            n_workers=_INFERENCE_WORKERS,
+            num_threads=None if _THREADS_PER_WORKER is None else int(_THREADS_PER_WORKER),
+        )
+
+
+@app.on_event("shutdown")
+async def close_batcher():
+    _BATCHER.close()
+    if _POOL is not None:
+        _POOL.close()
 
 
 ######################
@@ -57,19 +117,25 @@ async def root():
 @app.post("/api/translator", response_model=TranslationResponse)
 async def translator(
     translator_request: TranslationRequest,
+    accept: Optional[str] = Header(None),
 ):
-    text = translator_request.text
-    translations = _TRANSLATOR.translate(
-        text=text,
-        mini_batch_size=1,
-        model_name_or_path=_TRANSLATION_MODEL,
-        min_length=0,
-        max_length=500,
-        num_beams=1,
+    translations = await _BATCHER.submit_many(translator_request.text)
+    payload = {"text": [translation["text"] for translation in translations]}
+    return respond(payload, accept)
+
+
+@app.post("/api/translator/batch", response_model=List[TranslationResult])
+async def translator_batch(
+    translator_request: TranslationBatchRequest,
+    accept: Optional[str] = Header(None),
+):
+    return await respond_batch(
+        _translate_batch,
+        translator_request.text,
+        translator_request.mini_batch_size or _MINI_BATCH_SIZE,
+        accept,
+        executor=_BATCHER.executor,
     )
-    payload = {"text": translations}
-    print(payload)
-    return payload
 
 
 if __name__ == "__main__":